@@ -3,116 +3,232 @@
 Анализ структуры данных модели
 """
 
+import argparse
+import logging
+import mmap
 import pickle
+import pickletools
 import os
 from datetime import datetime
 
-def analyze_model_structure():
+from ml_model_inspect import pickle_protocol, reoptimize_pickle
+
+log = logging.getLogger(__name__)
+
+# Файлы больше этого размера по умолчанию анализируются без полной загрузки
+SUMMARY_THRESHOLD_BYTES = 200 * 1024 * 1024
+
+_STRING_OPCODES = {'SHORT_BINUNICODE', 'BINUNICODE', 'BINUNICODE8', 'UNICODE',
+                   'SHORT_BINSTRING', 'BINSTRING', 'STRING'}
+
+def _load_pickle_mmap(path):
+    """Загрузка pickle из отображенного в память файла"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            return pickle.loads(mm, fix_imports=False)
+    finally:
+        os.close(fd)
+
+def _summarize_pickle(path):
+    """Структурная сводка pickle по опкодам, без создания объектов"""
+    strings = []
+    seen_strings = set()
+    classes = set()
+    opcodes_count = 0
+    last_strings = []
+    
+    with open(path, 'rb') as f:
+        for opcode, arg, pos in pickletools.genops(f):
+            opcodes_count += 1
+            name = opcode.name
+            if name in _STRING_OPCODES:
+                last_strings = (last_strings + [arg])[-2:]
+                if arg not in seen_strings:
+                    seen_strings.add(arg)
+                    strings.append(arg)
+            elif name in ('GLOBAL', 'INST'):
+                classes.add(arg.replace(' ', '.'))
+            elif name == 'STACK_GLOBAL' and len(last_strings) == 2:
+                classes.add('.'.join(last_strings))
+    
+    return {
+        'opcodes': opcodes_count,
+        'strings': strings,
+        'classes': sorted(classes)
+    }
+
+def _print_pickle_summary(model_path):
+    """Вывод сводки по pickle без полной загрузки"""
+    log.info(f"📑 Сводка по опкодам (без загрузки): {model_path}")
+    summary = _summarize_pickle(model_path)
+    
+    log.info(f"   Опкодов: {summary['opcodes']}")
+    log.info(f"   Классы ({len(summary['classes'])}):")
+    for class_name in summary['classes']:
+        log.info(f"     {class_name}")
+    
+    log.info(f"   Строки/ключи ({len(summary['strings'])}), первые 50:")
+    for value in summary['strings'][:50]:
+        log.info(f"     {value[:100]}")
+    
+    model_classes = [c for c in summary['classes'] if c.startswith(('sklearn.', 'xgboost.', 'lightgbm.'))]
+    if model_classes:
+        log.info(f"✅ Найдены классы моделей: {len(model_classes)}")
+    else:
+        log.info("❌ Классы моделей не найдены")
+    log.info("   Для полного анализа запустите с флагом --deep")
+
+def _describe(value):
+    """Краткое описание узла структуры"""
+    if hasattr(value, 'predict'):
+        return f"✅ модель с методом predict ({type(value).__name__})"
+    if hasattr(value, 'fit'):
+        return "✅ имеет метод fit (обучаемый объект)"
+    if isinstance(value, dict):
+        return f"ключи: {list(value.keys())[:20]}"
+    if isinstance(value, (list, tuple)):
+        return f"📊 размер: {len(value)}"
+    if isinstance(value, str):
+        return f"📝 строка: {value[:50]}..."
+    if isinstance(value, (int, float)):
+        return f"🔢 число: {value}"
+    return ""
+
+def _format_path(path_parts: tuple) -> str:
+    """Путь к узлу в виде key.sub_key[0]"""
+    path = ""
+    for part in path_parts:
+        if isinstance(part, int):
+            path += f"[{part}]"
+        else:
+            path = f"{path}.{part}" if path else str(part)
+    return path
+
+def find_models(root, verbose: bool = False, max_print_depth: int = 2):
+    """Поиск моделей (объектов с predict) обходом без рекурсии
+    
+    При verbose печатает структуру данных до глубины max_print_depth
+    в том же проходе, что и поиск моделей.
+    """
+    models_found = []
+    stack = [(root, (), 0)]
+    seen = set()
+    
+    while stack:
+        data, path_parts, depth = stack.pop()
+        
+        if verbose and 0 < depth <= max_print_depth:
+            indent = "   " * depth
+            label = path_parts[-1]
+            if isinstance(label, int):
+                label = f"[{label}]"
+            log.info(f"{indent}{label}: {type(data).__name__}")
+            description = _describe(data)
+            if description:
+                log.info(f"{indent}   {description}")
+        
+        # Модель - лист обхода, внутрь не спускаемся.
+        # Строку пути формируем только для найденных моделей
+        if hasattr(data, 'predict'):
+            models_found.append((_format_path(path_parts), type(data).__name__))
+            continue
+        
+        # Общие контейнеры обходим только один раз. Скаляры сюда не попадают:
+        # малые числа и строки разделяют id, а их строки структуры печатаются всегда
+        if isinstance(data, (dict, list, tuple)):
+            oid = id(data)
+            if oid in seen:
+                continue
+            seen.add(oid)
+        
+        # Добавляем в обратном порядке, чтобы сохранить порядок обхода
+        if isinstance(data, dict):
+            stack.extend(reversed([
+                (value, path_parts + (str(key),), depth + 1)
+                for key, value in data.items()
+            ]))
+        elif isinstance(data, (list, tuple)):
+            stack.extend(reversed([
+                (item, path_parts + (i,), depth + 1)
+                for i, item in enumerate(data)
+            ]))
+    
+    return models_found
+
+def analyze_model_structure(deep: bool = False):
     """Анализ структуры данных модели"""
     
-    print("🔍 АНАЛИЗ СТРУКТУРЫ ДАННЫХ МОДЕЛИ")
-    print("=" * 50)
-    print(f"📅 Время: {datetime.now()}")
-    print()
+    log.info("🔍 АНАЛИЗ СТРУКТУРЫ ДАННЫХ МОДЕЛИ")
+    log.info("=" * 50)
+    log.info(f"📅 Время: {datetime.now()}")
+    log.info("")
     
     model_path = "data/universal_forecast_models.pkl"
     
     if not os.path.exists(model_path):
-        print(f"❌ Файл модели не найден: {model_path}")
+        log.info(f"❌ Файл модели не найден: {model_path}")
         return
     
     try:
-        print(f"📁 Загрузка модели из: {model_path}")
-        with open(model_path, 'rb') as f:
-            model_data = pickle.load(f)
+        if not deep and os.path.getsize(model_path) > SUMMARY_THRESHOLD_BYTES:
+            _print_pickle_summary(model_path)
+            log.info(f"\n📅 Анализ завершен: {datetime.now()}")
+            return
         
-        print(f"✅ Модель загружена")
-        print(f"   Тип данных: {type(model_data)}")
+        if pickle_protocol(model_path) < pickle.HIGHEST_PROTOCOL:
+            log.info(f"🔧 Пересохранение модели с протоколом {pickle.HIGHEST_PROTOCOL}")
+            model_data = reoptimize_pickle(model_path)
+        else:
+            log.info(f"📁 Загрузка модели из: {model_path}")
+            model_data = _load_pickle_mmap(model_path)
         
-        if isinstance(model_data, dict):
-            print(f"   Ключи: {list(model_data.keys())}")
-            
-            for key, value in model_data.items():
-                print(f"\n🔍 Анализ ключа: {key}")
-                print(f"   Тип значения: {type(value)}")
-                
-                if isinstance(value, dict):
-                    print(f"   Подключи: {list(value.keys())}")
-                    
-                    for sub_key, sub_value in value.items():
-                        print(f"     {sub_key}: {type(sub_value)}")
-                        if hasattr(sub_value, 'predict'):
-                            print(f"       ✅ Имеет метод predict (модель)")
-                        elif hasattr(sub_value, 'fit'):
-                            print(f"       ✅ Имеет метод fit (обучаемый объект)")
-                        elif isinstance(sub_value, (list, tuple)):
-                            print(f"       📊 Размер: {len(sub_value)}")
-                        elif isinstance(sub_value, str):
-                            print(f"       📝 Строка: {sub_value[:50]}...")
-                        elif isinstance(sub_value, (int, float)):
-                            print(f"       🔢 Число: {sub_value}")
-                
-                elif hasattr(value, 'predict'):
-                    print(f"   ✅ Прямая модель с методом predict")
-                    print(f"     Тип модели: {type(value).__name__}")
-                
-                elif isinstance(value, (list, tuple)):
-                    print(f"   📊 Список/кортеж размером: {len(value)}")
-                    if len(value) > 0:
-                        print(f"     Первый элемент: {type(value[0])}")
-                
-                elif isinstance(value, str):
-                    print(f"   📝 Строка: {value[:100]}...")
-                
-                else:
-                    print(f"   ❓ Неизвестный тип: {type(value)}")
+        log.info(f"✅ Модель загружена")
+        log.info(f"   Тип данных: {type(model_data)}")
         
-        # Поиск моделей
-        print(f"\n🤖 ПОИСК МОДЕЛЕЙ В ДАННЫХ")
-        print("=" * 30)
+        if isinstance(model_data, dict):
+            log.info(f"   Ключи: {list(model_data.keys())}")
         
-        models_found = []
+        # Структура и поиск моделей за один обход
+        log.info(f"\n🔍 СТРУКТУРА ДАННЫХ")
+        log.info("=" * 30)
         
-        def find_models(data, path=""):
-            if hasattr(data, 'predict'):
-                models_found.append((path, type(data).__name__))
-                return
-            
-            if isinstance(data, dict):
-                for key, value in data.items():
-                    find_models(value, f"{path}.{key}" if path else key)
-            elif isinstance(data, (list, tuple)):
-                for i, item in enumerate(data):
-                    find_models(item, f"{path}[{i}]")
+        models_found = find_models(model_data, verbose=True)
         
-        find_models(model_data)
+        log.info(f"\n🤖 ПОИСК МОДЕЛЕЙ В ДАННЫХ")
+        log.info("=" * 30)
         
         if models_found:
-            print(f"✅ Найдено моделей: {len(models_found)}")
+            log.info(f"✅ Найдено моделей: {len(models_found)}")
             for path, model_type in models_found:
-                print(f"   • {path}: {model_type}")
+                log.info(f"   • {path}: {model_type}")
         else:
-            print("❌ Модели не найдены")
+            log.info("❌ Модели не найдены")
         
         # Рекомендации
-        print(f"\n💡 РЕКОМЕНДАЦИИ")
-        print("=" * 20)
+        log.info(f"\n💡 РЕКОМЕНДАЦИИ")
+        log.info("=" * 20)
         
         if models_found:
-            print("✅ Модели найдены в данных")
-            print("   • Проверьте код загрузки на соответствие структуре")
-            print("   • Убедитесь, что пути к моделям правильные")
+            log.info("✅ Модели найдены в данных")
+            log.info("   • Проверьте код загрузки на соответствие структуре")
+            log.info("   • Убедитесь, что пути к моделям правильные")
         else:
-            print("❌ Модели не найдены в данных")
-            print("   • Проверьте, что файл содержит обученные модели")
-            print("   • Возможно, нужно переобучить модели")
+            log.info("❌ Модели не найдены в данных")
+            log.info("   • Проверьте, что файл содержит обученные модели")
+            log.info("   • Возможно, нужно переобучить модели")
         
-        print(f"\n📅 Анализ завершен: {datetime.now()}")
+        log.info(f"\n📅 Анализ завершен: {datetime.now()}")
         
     except Exception as e:
-        print(f"❌ Ошибка анализа: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"❌ Ошибка анализа: {e}")
 
 if __name__ == "__main__":
-    analyze_model_structure() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Анализ структуры данных модели")
+    parser.add_argument('--deep', action='store_true',
+                        help='полная загрузка модели независимо от размера файла')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    analyze_model_structure(deep=args.deep) 
\ No newline at end of file
@@ -3,22 +3,121 @@
 Проверка ML-моделей внутри Docker контейнера
 """
 
+import os
+import re
 import subprocess
-import json
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any
+
+from ml_model_inspect import json_loads, save_results
+
+try:
+    import docker
+except ImportError:
+    docker = None
+
+# ML-сервис публикует порт 8002 на хосте, поэтому HTTP-запросы
+# отправляем напрямую через общую сессию, без docker exec curl
+ML_URL = os.getenv('ML_URL', 'http://localhost:8002')
+_session = None
+
+def get_session():
+    """Общая HTTP-сессия; requests импортируется только при первом запросе"""
+    global _session
+    if _session is None:
+        import requests
+        _session = requests.Session()
+    return _session
+
+# Команды диагностики, не зависящие друг от друга
+MODELS_FILES_COMMAND = ['docker', 'exec', 'ml-service', 'ls', '-la', '/app/data/models/']
+CONTAINER_STATS_COMMAND = [
+    'docker', 'stats', 'ml-service', '--no-stream', '--format', 'table {{.Container}}\t{{.CPUPerc}}\t{{.MemUsage}}\t{{.MemPerc}}'
+]
+ML_LOGS_COMMAND = ['docker', 'logs', '--tail', '20', 'ml-service']
+
+# Признаки ошибок в строках логов
+ERROR_PATTERN = re.compile(r'error|exception', re.IGNORECASE)
 
 def run_docker_command(command: list) -> tuple:
     """Выполнение команды в Docker контейнере"""
     try:
-        result = subprocess.run(command, capture_output=True, text=True, timeout=30)
-        return result.returncode == 0, result.stdout, result.stderr
+        result = subprocess.run(command, capture_output=True, timeout=30)
+        # Читаем байты и декодируем один раз
+        return (
+            result.returncode == 0,
+            result.stdout.decode('utf-8', 'replace'),
+            result.stderr.decode('utf-8', 'replace')
+        )
     except subprocess.TimeoutExpired:
         return False, "", "Timeout expired"
     except Exception as e:
         return False, "", str(e)
 
+ML_CONTAINER = 'ml-service'
+_docker_container = None
+
+def get_ml_container():
+    """Контейнер ML-сервиса через постоянный клиент Docker SDK (None, если SDK недоступен)"""
+    global _docker_container
+    if _docker_container is None and docker is not None:
+        try:
+            _docker_container = docker.from_env().containers.get(ML_CONTAINER)
+        except Exception:
+            return None
+    return _docker_container
+
+def _format_stats(stats: dict) -> str:
+    """Таблица статистики в формате docker stats"""
+    cpu_stats = stats.get('cpu_stats', {})
+    precpu_stats = stats.get('precpu_stats', {})
+    cpu_delta = cpu_stats.get('cpu_usage', {}).get('total_usage', 0) - precpu_stats.get('cpu_usage', {}).get('total_usage', 0)
+    system_delta = cpu_stats.get('system_cpu_usage', 0) - precpu_stats.get('system_cpu_usage', 0)
+    online_cpus = cpu_stats.get('online_cpus', 1)
+    cpu_percent = cpu_delta / system_delta * online_cpus * 100 if system_delta > 0 else 0.0
+    
+    memory = stats.get('memory_stats', {})
+    mem_usage = memory.get('usage', 0)
+    mem_limit = memory.get('limit', 0)
+    mem_percent = mem_usage / mem_limit * 100 if mem_limit else 0.0
+    
+    return (
+        "CONTAINER\tCPU %\tMEM USAGE / LIMIT\tMEM %\n"
+        f"{ML_CONTAINER}\t{cpu_percent:.2f}%\t{mem_usage / 2**20:.1f}MiB / {mem_limit / 2**20:.1f}MiB\t{mem_percent:.2f}%"
+    )
+
+def fetch_models_files() -> tuple:
+    """Список файлов моделей в контейнере"""
+    container = get_ml_container()
+    if container is None:
+        return run_docker_command(MODELS_FILES_COMMAND)
+    try:
+        exit_code, output = container.exec_run(MODELS_FILES_COMMAND[3:])
+        text = output.decode('utf-8', 'replace')
+        return exit_code == 0, text, "" if exit_code == 0 else text
+    except Exception as e:
+        return False, "", str(e)
+
+def fetch_container_stats() -> tuple:
+    """Статистика ресурсов контейнера"""
+    container = get_ml_container()
+    if container is None:
+        return run_docker_command(CONTAINER_STATS_COMMAND)
+    try:
+        return True, _format_stats(container.stats(stream=False)), ""
+    except Exception as e:
+        return False, "", str(e)
+
+def fetch_ml_logs() -> tuple:
+    """Последние строки логов контейнера"""
+    container = get_ml_container()
+    if container is None:
+        return run_docker_command(ML_LOGS_COMMAND)
+    try:
+        return True, container.logs(tail=20).decode('utf-8', 'replace'), ""
+    except Exception as e:
+        return False, "", str(e)
+
 def check_docker_containers():
     """Проверка Docker контейнеров"""
     print("🔍 Проверка Docker контейнеров...")
@@ -37,70 +136,71 @@ def check_docker_containers():
     else:
         print("❌ ML-сервис не найден в запущенных контейнерах")
         print("   Запущенные контейнеры:")
-        for line in output.strip().split('\n')[1:]:  # Пропускаем заголовок
+        for line in output.splitlines()[1:]:  # Пропускаем заголовок
             if line.strip():
                 print(f"     {line}")
         return False
 
 def check_ml_service_health():
-    """Проверка здоровья ML-сервиса через Docker"""
+    """Проверка здоровья ML-сервиса"""
     print("\n🏥 Проверка здоровья ML-сервиса...")
     
-    # Проверяем через curl внутри контейнера
-    success, output, error = run_docker_command([
-        'docker', 'exec', 'ml-service', 'curl', '-s', 'http://localhost:8002/health'
-    ])
+    try:
+        response = get_session().get(f"{ML_URL}/health", timeout=5)
+    except OSError as e:
+        print(f"❌ ML-сервис недоступен: {e}")
+        return False, None
     
-    if success and output:
+    if response.ok:
         try:
-            health_data = json.loads(output)
+            health_data = json_loads(response.content)
             print("✅ ML-сервис здоров")
             print(f"   Загружено моделей: {health_data.get('models_loaded', 0)}")
             return True, health_data
-        except json.JSONDecodeError:
-            print(f"❌ Неверный ответ от сервиса: {output}")
+        except ValueError:
+            print(f"❌ Неверный ответ от сервиса: {response.text}")
             return False, None
     else:
-        print(f"❌ ML-сервис недоступен: {error}")
+        print(f"❌ ML-сервис недоступен: {response.status_code}")
         return False, None
 
 def get_models_status():
-    """Получение статуса моделей через Docker"""
+    """Получение статуса моделей"""
     print("\n📊 Получение статуса моделей...")
     
-    success, output, error = run_docker_command([
-        'docker', 'exec', 'ml-service', 'curl', '-s', 'http://localhost:8002/models/status'
-    ])
+    try:
+        response = get_session().get(f"{ML_URL}/models/status", timeout=5)
+    except OSError as e:
+        print(f"❌ Ошибка получения статуса: {e}")
+        return None
     
-    if success and output:
+    if response.ok:
         try:
-            return json.loads(output)
-        except json.JSONDecodeError:
-            print(f"❌ Неверный ответ от API: {output}")
+            return json_loads(response.content)
+        except ValueError:
+            print(f"❌ Неверный ответ от API: {response.text}")
             return None
     else:
-        print(f"❌ Ошибка получения статуса: {error}")
+        print(f"❌ Ошибка получения статуса: {response.status_code}")
         return None
 
-def check_models_files():
+def check_models_files(command_result: tuple = None):
     """Проверка файлов моделей в контейнере"""
     print("\n📁 Проверка файлов моделей в контейнере...")
     
-    success, output, error = run_docker_command([
-        'docker', 'exec', 'ml-service', 'ls', '-la', '/app/data/models/'
-    ])
+    success, output, error = command_result or fetch_models_files()
     
     if success:
         print("✅ Директория моделей найдена")
-        lines = output.strip().split('\n')
-        model_files = [line for line in lines if line.endswith(('.pkl', '.joblib'))]
+        model_files = [line for line in output.splitlines() if line.endswith(('.pkl', '.joblib'))]
+        files_count = len(model_files)
         
-        if model_files:
-            print(f"   Найдено файлов моделей: {len(model_files)}")
+        if files_count:
+            print(f"   Найдено файлов моделей: {files_count}")
             for file_info in model_files[:5]:
                 print(f"     {file_info}")
-            if len(model_files) > 5:
-                print(f"     ... и еще {len(model_files) - 5} файлов")
+            if files_count > 5:
+                print(f"     ... и еще {files_count - 5} файлов")
             return model_files
         else:
             print("   ⚠️ Файлы моделей не найдены")
@@ -110,7 +210,7 @@ def check_models_files():
         return []
 
 def test_forecast_in_container(product_id: str = "30001"):
-    """Тестирование прогноза через контейнер"""
+    """Тестирование прогноза"""
     print(f"\n🧪 Тестирование прогноза для {product_id}...")
     
     forecast_request = {
@@ -119,45 +219,75 @@ def test_forecast_in_container(product_id: str = "30001"):
         "model_type": None
     }
     
-    # Отправляем запрос через curl в контейнере
-    success, output, error = run_docker_command([
-        'docker', 'exec', 'ml-service', 'curl', '-s', '-X', 'POST',
-        'http://localhost:8002/forecast',
-        '-H', 'Content-Type: application/json',
-        '-d', json.dumps(forecast_request)
-    ])
+    try:
+        response = get_session().post(f"{ML_URL}/forecast", json=forecast_request, timeout=30)
+    except OSError as e:
+        print(f"❌ Ошибка получения прогноза: {e}")
+        return None
     
-    if success and output:
+    if response.ok:
         try:
-            forecast_data = json.loads(output)
-            print("✅ Прогноз получен")
-            print(f"   Дневной спрос: {forecast_data.get('daily_demand', 0):.2f}")
-            print(f"   Точность: {forecast_data.get('accuracy', 0):.2%}")
-            print(f"   Модель: {forecast_data.get('model_type', 'unknown')}")
+            forecast_data = json_loads(response.content)
+            print_forecast(forecast_data)
             return forecast_data
-        except json.JSONDecodeError:
-            print(f"❌ Неверный ответ прогноза: {output}")
+        except ValueError:
+            print(f"❌ Неверный ответ прогноза: {response.text}")
             return None
     else:
-        print(f"❌ Ошибка получения прогноза: {error}")
+        print(f"❌ Ошибка получения прогноза: {response.status_code}")
         return None
 
-def check_ml_logs():
+def batch_forecast(product_ids: list, days: int = 30):
+    """Прогнозы для нескольких продуктов одним запросом
+    
+    Возвращает словарь product_id -> прогноз или None, если сервис
+    не поддерживает /forecast/batch.
+    """
+    batch_request = [
+        {"product_id": product_id, "forecast_days": days, "model_type": None}
+        for product_id in product_ids
+    ]
+    try:
+        response = get_session().post(f"{ML_URL}/forecast/batch", json=batch_request, timeout=60)
+    except OSError as e:
+        print(f"⚠️ Ошибка пакетного прогноза: {e}")
+        return None
+    
+    if not response.ok:
+        print(f"⚠️ Пакетный прогноз недоступен: {response.status_code}")
+        return None
+    
+    try:
+        return dict(zip(product_ids, json_loads(response.content)))
+    except ValueError:
+        print(f"⚠️ Неверный ответ пакетного прогноза: {response.text}")
+        return None
+
+def print_forecast(forecast_data: dict):
+    """Вывод основных показателей прогноза"""
+    print("✅ Прогноз получен")
+    print(f"   Дневной спрос: {forecast_data.get('daily_demand', 0):.2f}")
+    print(f"   Точность: {forecast_data.get('accuracy', 0):.2%}")
+    print(f"   Модель: {forecast_data.get('model_type', 'unknown')}")
+
+def check_ml_logs(command_result: tuple = None):
     """Проверка логов ML-сервиса"""
     print("\n📋 Проверка логов ML-сервиса...")
     
-    success, output, error = run_docker_command([
-        'docker', 'logs', '--tail', '20', 'ml-service'
-    ])
+    success, output, error = command_result or fetch_ml_logs()
     
     if success:
         print("📄 Последние 20 строк логов:")
-        for line in output.strip().split('\n'):
-            if line.strip():
-                print(f"   {line}")
+        # Вывод строк и поиск ошибок за один проход
+        error_lines = []
+        for line in output.splitlines():
+            line = line.rstrip()
+            if not line:
+                continue
+            print(f"   {line}")
+            if ERROR_PATTERN.search(line):
+                error_lines.append(line)
         
-        # Проверяем наличие ошибок
-        error_lines = [line for line in output.split('\n') if 'error' in line.lower() or 'exception' in line.lower()]
         if error_lines:
             print(f"\n⚠️ Найдено {len(error_lines)} строк с ошибками:")
             for line in error_lines[:5]:
@@ -165,17 +295,15 @@ def check_ml_logs():
     else:
         print(f"❌ Ошибка получения логов: {error}")
 
-def check_container_resources():
+def check_container_resources(command_result: tuple = None):
     """Проверка ресурсов контейнера"""
     print("\n💾 Проверка ресурсов контейнера...")
     
-    success, output, error = run_docker_command([
-        'docker', 'stats', 'ml-service', '--no-stream', '--format', 'table {{.Container}}\t{{.CPUPerc}}\t{{.MemUsage}}\t{{.MemPerc}}'
-    ])
+    success, output, error = command_result or fetch_container_stats()
     
     if success:
         print("📊 Статистика ресурсов:")
-        for line in output.strip().split('\n'):
+        for line in output.splitlines():
             if line.strip():
                 print(f"   {line}")
     else:
@@ -223,23 +351,42 @@ def main():
         else:
             print("   ⚠️ Нет загруженных моделей")
     
+    # Независимые docker-команды для шагов 4-6 выполняем параллельно,
+    # а вывод печатаем последовательно
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        files_future = executor.submit(fetch_models_files)
+        stats_future = executor.submit(fetch_container_stats)
+        logs_future = executor.submit(fetch_ml_logs)
+    
     # 4. Проверяем файлы моделей
-    model_files = check_models_files()
+    model_files = check_models_files(files_future.result())
     
     # 5. Проверяем ресурсы
-    check_container_resources()
+    check_container_resources(stats_future.result())
     
     # 6. Проверяем логи
-    check_ml_logs()
+    check_ml_logs(logs_future.result())
     
     # 7. Тестируем прогноз
     print("\n🧪 Тестирование прогнозов...")
     test_products = ["30001", "30002", "60001", "360360"]
     
-    for product_id in test_products:
-        forecast = test_forecast_in_container(product_id)
-        if not forecast:
-            print(f"   ❌ Прогноз недоступен для {product_id}")
+    forecasts = batch_forecast(test_products)
+    if forecasts is not None:
+        for product_id, forecast in forecasts.items():
+            print(f"\n🧪 Прогноз для {product_id}...")
+            if forecast:
+                print_forecast(forecast)
+            else:
+                print(f"   ❌ Прогноз недоступен для {product_id}")
+    else:
+        # Сервис без /forecast/batch - прогнозы по одному продукту
+        forecasts = {}
+        for product_id in test_products:
+            forecast = test_forecast_in_container(product_id)
+            forecasts[product_id] = forecast
+            if not forecast:
+                print(f"   ❌ Прогноз недоступен для {product_id}")
     
     # 8. Сохраняем результаты
     print("\n💾 Сохранение результатов...")
@@ -251,17 +398,11 @@ def main():
         "health_data": health_data,
         "models_status": models_status,
         "model_files": model_files,
-        "test_results": {}
+        "test_results": forecasts
     }
     
-    # Добавляем результаты тестов
-    for product_id in test_products:
-        forecast = test_forecast_in_container(product_id)
-        results["test_results"][product_id] = forecast
-    
     # Сохраняем в файл
-    with open('ml_models_docker_status.json', 'w', encoding='utf-8') as f:
-        json.dump(results, f, ensure_ascii=False, indent=2, default=str)
+    save_results(results, 'ml_models_docker_status.json')
     
     print("✅ Результаты сохранены в файл: ml_models_docker_status.json")
     
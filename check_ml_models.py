@@ -4,207 +4,245 @@
 """
 
 import asyncio
+import os
 import aiohttp
-import json
 from datetime import datetime
 from typing import Dict, Any
 
-async def check_ml_service_health():
+from ml_model_inspect import json_loads, save_results
+
+async def check_ml_service_health(session: aiohttp.ClientSession):
     """Проверка здоровья ML-сервиса"""
     try:
-        async with aiohttp.ClientSession() as session:
-            # Проверяем здоровье сервиса
-            async with session.get("http://localhost:8002/health") as response:
-                if response.status == 200:
-                    health_data = await response.json()
-                    print("✅ ML-сервис здоров")
-                    print(f"   Загружено моделей: {health_data.get('models_loaded', 0)}")
-                    return True
-                else:
-                    print(f"❌ ML-сервис недоступен: {response.status}")
-                    return False
+        # Проверяем здоровье сервиса
+        async with session.get("http://localhost:8002/health") as response:
+            if response.status == 200:
+                health_data = await response.json(loads=json_loads)
+                print("✅ ML-сервис здоров")
+                print(f"   Загружено моделей: {health_data.get('models_loaded', 0)}")
+                return True
+            else:
+                print(f"❌ ML-сервис недоступен: {response.status}")
+                return False
     except Exception as e:
         print(f"❌ Ошибка подключения к ML-сервису: {e}")
         return False
 
-async def get_models_status():
+async def get_models_status(session: aiohttp.ClientSession):
     """Получение статуса всех моделей"""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get("http://localhost:8002/models/status") as response:
-                if response.status == 200:
-                    status_data = await response.json()
-                    return status_data
-                else:
-                    print(f"❌ Ошибка получения статуса моделей: {response.status}")
-                    return None
+        async with session.get("http://localhost:8002/models/status") as response:
+            if response.status == 200:
+                status_data = await response.json(loads=json_loads)
+                return status_data
+            else:
+                print(f"❌ Ошибка получения статуса моделей: {response.status}")
+                return None
     except Exception as e:
         print(f"❌ Ошибка получения статуса моделей: {e}")
         return None
 
-async def get_model_performance(product_id: str):
+async def get_model_performance(session: aiohttp.ClientSession, product_id: str):
     """Получение производительности модели для конкретного продукта"""
     try:
-        async with aiohttp.ClientSession() as session:
-            url = f"http://localhost:8002/models/{product_id}/performance"
-            async with session.get(url) as response:
-                if response.status == 200:
-                    performance_data = await response.json()
-                    return performance_data
-                else:
-                    print(f"❌ Ошибка получения производительности для {product_id}: {response.status}")
-                    return None
+        url = f"http://localhost:8002/models/{product_id}/performance"
+        async with session.get(url) as response:
+            if response.status == 200:
+                performance_data = await response.json(loads=json_loads)
+                return performance_data
+            else:
+                print(f"❌ Ошибка получения производительности для {product_id}: {response.status}")
+                return None
     except Exception as e:
         print(f"❌ Ошибка получения производительности: {e}")
         return None
 
-async def test_forecast(product_id: str = "30001"):
+async def test_forecast(session: aiohttp.ClientSession, product_id: str = "30001"):
     """Тестирование прогноза для продукта"""
     try:
-        async with aiohttp.ClientSession() as session:
-            # Тестовые данные для прогноза
-            forecast_request = {
-                "product_id": product_id,
-                "forecast_days": 30,
-                "model_type": None  # Автоматический выбор лучшей модели
-            }
-            
-            async with session.post("http://localhost:8002/forecast", json=forecast_request) as response:
-                if response.status == 200:
-                    forecast_data = await response.json()
-                    return forecast_data
-                else:
-                    print(f"❌ Ошибка получения прогноза для {product_id}: {response.status}")
-                    return None
+        # Тестовые данные для прогноза
+        forecast_request = {
+            "product_id": product_id,
+            "forecast_days": 30,
+            "model_type": None  # Автоматический выбор лучшей модели
+        }
+        
+        async with session.post("http://localhost:8002/forecast", json=forecast_request) as response:
+            if response.status == 200:
+                forecast_data = await response.json(loads=json_loads)
+                return forecast_data
+            else:
+                print(f"❌ Ошибка получения прогноза для {product_id}: {response.status}")
+                return None
     except Exception as e:
         print(f"❌ Ошибка тестирования прогноза: {e}")
         return None
 
-async def check_models_directory():
+async def batch_forecast(session: aiohttp.ClientSession, product_ids: list, days: int = 30):
+    """Прогнозы для нескольких продуктов одним запросом
+    
+    Возвращает словарь product_id -> прогноз или None, если сервис
+    не поддерживает /forecast/batch.
+    """
+    batch_request = [
+        {"product_id": product_id, "forecast_days": days, "model_type": None}
+        for product_id in product_ids
+    ]
+    try:
+        async with session.post("http://localhost:8002/forecast/batch", json=batch_request) as response:
+            if response.status == 200:
+                forecasts_data = await response.json(loads=json_loads)
+                return dict(zip(product_ids, forecasts_data))
+            else:
+                print(f"⚠️ Пакетный прогноз недоступен: {response.status}")
+                return None
+    except Exception as e:
+        print(f"⚠️ Ошибка пакетного прогноза: {e}")
+        return None
+
+def check_models_directory():
     """Проверка файлов моделей в директории"""
-    import os
-    
     models_dir = "/app/data/models"
     if not os.path.exists(models_dir):
         print(f"❌ Директория моделей не найдена: {models_dir}")
         return []
     
-    model_files = []
-    for filename in os.listdir(models_dir):
-        if filename.endswith('.pkl') or filename.endswith('.joblib'):
-            model_files.append(filename)
-    
-    return model_files
+    with os.scandir(models_dir) as entries:
+        return [
+            entry.name for entry in entries
+            if entry.is_file(follow_symlinks=False) and entry.name.endswith(('.pkl', '.joblib'))
+        ]
 
 async def main():
     """Основная функция проверки"""
     
-    print("🔍 ПРОВЕРКА СТАТУСА ML-МОДЕЛЕЙ")
-    print("=" * 50)
-    
-    # 1. Проверяем здоровье сервиса
-    print("\n1️⃣ Проверка здоровья ML-сервиса...")
-    service_healthy = await check_ml_service_health()
-    
-    if not service_healthy:
-        print("❌ ML-сервис недоступен. Проверьте, что сервис запущен.")
-        return
-    
-    # 2. Получаем статус моделей
-    print("\n2️⃣ Получение статуса моделей...")
-    models_status = await get_models_status()
-    
-    if models_status:
-        print("📊 СТАТУС МОДЕЛЕЙ:")
-        print(f"   Всего моделей: {models_status.get('total_models', 0)}")
-        print(f"   Средняя точность: {models_status.get('average_accuracy', 0):.2%}")
-        
-        models_by_type = models_status.get('models_by_type', {})
-        if models_by_type:
-            print("   Модели по типам:")
-            for model_type, count in models_by_type.items():
-                print(f"     {model_type}: {count} моделей")
-        else:
-            print("   ⚠️ Нет загруженных моделей")
-    
-    # 3. Проверяем файлы моделей
-    print("\n3️⃣ Проверка файлов моделей...")
-    model_files = await check_models_directory()
-    
-    if model_files:
-        print(f"📁 Найдено файлов моделей: {len(model_files)}")
-        for filename in model_files[:5]:  # Показываем первые 5
-            print(f"   {filename}")
-        if len(model_files) > 5:
-            print(f"   ... и еще {len(model_files) - 5} файлов")
-    else:
-        print("❌ Файлы моделей не найдены")
-    
-    # 4. Тестируем прогноз для конкретного продукта
-    print("\n4️⃣ Тестирование прогноза...")
     test_products = ["30001", "30002", "60001", "360360"]
     
-    for product_id in test_products:
-        print(f"\n   Тестирование продукта {product_id}...")
-        
-        # Получаем производительность модели
-        performance = await get_model_performance(product_id)
-        if performance:
-            print(f"     Производительность:")
-            for perf in performance:
-                print(f"       {perf['model_type']}: точность {perf['accuracy']:.2%}")
-        
-        # Тестируем прогноз
-        forecast = await test_forecast(product_id)
-        if forecast:
-            print(f"     Прогноз:")
-            print(f"       Дневной спрос: {forecast.get('daily_demand', 0):.2f}")
-            print(f"       Точность: {forecast.get('accuracy', 0):.2%}")
-            print(f"       Модель: {forecast.get('model_type', 'unknown')}")
+    # Пул соединений с кешем DNS для параллельных запросов по продуктам
+    connector = aiohttp.TCPConnector(
+        limit=len(test_products) * 2,
+        use_dns_cache=True,
+        ttl_dns_cache=300,
+        keepalive_timeout=30
+    )
+    timeout = aiohttp.ClientTimeout(total=30)
+    
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        print("🔍 ПРОВЕРКА СТАТУСА ML-МОДЕЛЕЙ")
+        print("=" * 50)
+        
+        # 1. Проверяем здоровье сервиса
+        print("\n1️⃣ Проверка здоровья ML-сервиса...")
+        service_healthy = await check_ml_service_health(session)
+        
+        if not service_healthy:
+            print("❌ ML-сервис недоступен. Проверьте, что сервис запущен.")
+            return
+        
+        # 2. Получаем статус моделей
+        print("\n2️⃣ Получение статуса моделей...")
+        models_status = await get_models_status(session)
+        
+        if models_status:
+            print("📊 СТАТУС МОДЕЛЕЙ:")
+            print(f"   Всего моделей: {models_status.get('total_models', 0)}")
+            print(f"   Средняя точность: {models_status.get('average_accuracy', 0):.2%}")
+            
+            models_by_type = models_status.get('models_by_type', {})
+            if models_by_type:
+                print("   Модели по типам:")
+                for model_type, count in models_by_type.items():
+                    print(f"     {model_type}: {count} моделей")
+            else:
+                print("   ⚠️ Нет загруженных моделей")
+        
+        # 3. Проверяем файлы моделей
+        print("\n3️⃣ Проверка файлов моделей...")
+        model_files = check_models_directory()
+        
+        if model_files:
+            print(f"📁 Найдено файлов моделей: {len(model_files)}")
+            for filename in model_files[:5]:  # Показываем первые 5
+                print(f"   {filename}")
+            if len(model_files) > 5:
+                print(f"   ... и еще {len(model_files) - 5} файлов")
         else:
-            print(f"     ❌ Прогноз недоступен")
-    
-    # 5. Сохраняем результаты
-    print("\n5️⃣ Сохранение результатов...")
-    
-    results = {
-        "timestamp": datetime.now().isoformat(),
-        "service_healthy": service_healthy,
-        "models_status": models_status,
-        "model_files": model_files,
-        "test_results": {}
-    }
-    
-    # Добавляем результаты тестов
-    for product_id in test_products:
-        performance = await get_model_performance(product_id)
-        forecast = await test_forecast(product_id)
-        
-        results["test_results"][product_id] = {
-            "performance": performance,
-            "forecast": forecast
+            print("❌ Файлы моделей не найдены")
+        
+        # 4. Тестируем прогноз для конкретного продукта
+        print("\n4️⃣ Тестирование прогноза...")
+        
+        # Производительность по продуктам и пакетный прогноз запрашиваем параллельно
+        *performance_list, forecasts = await asyncio.gather(
+            *(get_model_performance(session, product_id) for product_id in test_products),
+            batch_forecast(session, test_products)
+        )
+        performances = dict(zip(test_products, performance_list))
+        
+        if forecasts is None:
+            # Сервис без /forecast/batch - прогнозы по одному продукту
+            forecast_list = await asyncio.gather(
+                *(test_forecast(session, product_id) for product_id in test_products)
+            )
+            forecasts = dict(zip(test_products, forecast_list))
+        
+        for product_id in test_products:
+            print(f"\n   Тестирование продукта {product_id}...")
+            
+            # Производительность модели
+            performance = performances[product_id]
+            if performance:
+                print(f"     Производительность:")
+                for perf in performance:
+                    print(f"       {perf['model_type']}: точность {perf['accuracy']:.2%}")
+            
+            # Прогноз
+            forecast = forecasts[product_id]
+            if forecast:
+                print(f"     Прогноз:")
+                print(f"       Дневной спрос: {forecast.get('daily_demand', 0):.2f}")
+                print(f"       Точность: {forecast.get('accuracy', 0):.2%}")
+                print(f"       Модель: {forecast.get('model_type', 'unknown')}")
+            else:
+                print(f"     ❌ Прогноз недоступен")
+        
+        # 5. Сохраняем результаты
+        print("\n5️⃣ Сохранение результатов...")
+        
+        results = {
+            "timestamp": datetime.now().isoformat(),
+            "service_healthy": service_healthy,
+            "models_status": models_status,
+            "model_files": model_files,
+            "test_results": {}
         }
-    
-    # Сохраняем в файл
-    with open('ml_models_status.json', 'w', encoding='utf-8') as f:
-        json.dump(results, f, ensure_ascii=False, indent=2, default=str)
-    
-    print("✅ Результаты сохранены в файл: ml_models_status.json")
-    
-    # 6. Вывод итогового статуса
-    print("\n" + "=" * 50)
-    print("📋 ИТОГОВЫЙ СТАТУС:")
-    
-    if service_healthy and models_status and models_status.get('total_models', 0) > 0:
-        print("✅ ML-модели обучены и готовы к использованию")
-        print(f"   Загружено моделей: {models_status.get('total_models', 0)}")
-        print(f"   Средняя точность: {models_status.get('average_accuracy', 0):.2%}")
-    elif service_healthy:
-        print("⚠️ ML-сервис работает, но модели не загружены")
-        print("   Необходимо обучить модели")
-    else:
-        print("❌ ML-сервис недоступен")
-        print("   Проверьте, что сервис запущен")
+        
+        # Добавляем уже полученные результаты тестов
+        for product_id in test_products:
+            results["test_results"][product_id] = {
+                "performance": performances[product_id],
+                "forecast": forecasts[product_id]
+            }
+        
+        # Сохраняем в файл
+        save_results(results, 'ml_models_status.json')
+        
+        print("✅ Результаты сохранены в файл: ml_models_status.json")
+        
+        # 6. Вывод итогового статуса
+        print("\n" + "=" * 50)
+        print("📋 ИТОГОВЫЙ СТАТУС:")
+        
+        if service_healthy and models_status and models_status.get('total_models', 0) > 0:
+            print("✅ ML-модели обучены и готовы к использованию")
+            print(f"   Загружено моделей: {models_status.get('total_models', 0)}")
+            print(f"   Средняя точность: {models_status.get('average_accuracy', 0):.2%}")
+        elif service_healthy:
+            print("⚠️ ML-сервис работает, но модели не загружены")
+            print("   Необходимо обучить модели")
+        else:
+            print("❌ ML-сервис недоступен")
+            print("   Проверьте, что сервис запущен")
 
 if __name__ == "__main__":
     asyncio.run(main()) 
\ No newline at end of file
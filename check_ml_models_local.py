@@ -3,12 +3,88 @@
 Проверка ML моделей в локальной среде
 """
 
+import csv
 import os
-import pickle
-import pandas as pd
+import sys
 import numpy as np
+from collections import Counter
 from datetime import datetime
-import json
+
+from ml_model_inspect import load_model_file, classify_model_data, is_model, save_json
+
+def _scan_csv(path, head_rows: int = 5):
+    """Сводка по CSV за один потоковый проход без pandas
+    
+    Возвращает число строк, колонки, первые строки и агрегаты
+    (count/sum/mean/min/max) по числовым колонкам.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        columns = next(reader, [])
+        head = []
+        stats = {column: {'count': 0, 'sum': 0.0, 'min': None, 'max': None} for column in columns}
+        numeric = set(columns)
+        unique_products = set()
+        product_idx = columns.index('product_code') if 'product_code' in columns else None
+        rows = 0
+        
+        for row in reader:
+            # Пустые строки пропускаем, как pandas (skip_blank_lines)
+            if not row:
+                continue
+            rows += 1
+            if len(head) < head_rows:
+                head.append(row)
+            if product_idx is not None and product_idx < len(row):
+                unique_products.add(row[product_idx])
+            
+            for column, value in zip(columns, row):
+                if column not in numeric or value == '':
+                    continue
+                try:
+                    number = float(value)
+                except ValueError:
+                    numeric.discard(column)
+                    continue
+                column_stats = stats[column]
+                column_stats['count'] += 1
+                column_stats['sum'] += number
+                if column_stats['min'] is None or number < column_stats['min']:
+                    column_stats['min'] = number
+                if column_stats['max'] is None or number > column_stats['max']:
+                    column_stats['max'] = number
+    
+    summary_stats = {}
+    for column in columns:
+        column_stats = stats[column]
+        if column in numeric and column_stats['count']:
+            column_stats['mean'] = column_stats['sum'] / column_stats['count']
+            summary_stats[column] = column_stats
+    
+    return {
+        'shape': (rows, len(columns)),
+        'columns': columns,
+        'head': head,
+        'summary_stats': summary_stats,
+        'unique_products': len(unique_products) if product_idx is not None else None
+    }
+
+def _print_head(summary):
+    """Вывод первых строк CSV"""
+    lines = ["\t".join(summary['columns'])]
+    lines.extend("\t".join(row) for row in summary['head'])
+    print('\n'.join(lines))
+
+# Тип файла по расширению
+EXT_KIND = {'.pkl': 'model', '.joblib': 'model', '.csv': 'csv'}
+
+def _csv_category(name: str) -> str:
+    """Категория CSV-файла по имени (name в нижнем регистре)"""
+    if 'performance' in name or 'accuracy' in name:
+        return 'performance'
+    if 'stock' in name:
+        return 'stock'
+    return 'other'
 
 def check_model_files():
     """Проверка файлов моделей"""
@@ -22,37 +98,49 @@ def check_model_files():
     ]
     
     model_files = []
-    csv_files = []
+    csv_files = {'performance': [], 'stock': [], 'other': []}
     
     for data_dir in data_dirs:
         if os.path.exists(data_dir):
-            print(f"\n📁 Директория: {data_dir}")
+            lines = [f"\n📁 Директория: {data_dir}"]
+            
+            # Ищем и классифицируем файлы за один проход по директории
+            with os.scandir(data_dir) as entries:
+                for entry in entries:
+                    filename = entry.name
+                    lower_name = filename.lower()
+                    kind = EXT_KIND.get(os.path.splitext(lower_name)[1])
+                    if kind == 'model':
+                        model_files.append(entry.path)
+                        lines.append(f"   ✅ Модель: {filename}")
+                    elif kind == 'csv':
+                        csv_files[_csv_category(lower_name)].append(entry.path)
+                        lines.append(f"   📊 Данные: {filename}")
             
-            # Ищем файлы моделей
-            for filename in os.listdir(data_dir):
-                filepath = os.path.join(data_dir, filename)
-                if filename.endswith('.pkl') or filename.endswith('.joblib'):
-                    model_files.append(filepath)
-                    print(f"   ✅ Модель: {filename}")
-                elif filename.endswith('.csv'):
-                    csv_files.append(filepath)
-                    print(f"   📊 Данные: {filename}")
+            # Листинг директории выводим одной записью
+            print('\n'.join(lines))
     
     return model_files, csv_files
 
 def load_and_test_models(model_files):
-    """Загрузка и тестирование моделей"""
+    """Загрузка и тестирование моделей
+    
+    Возвращает (models_info, counts), где counts - Counter с ключами
+    total, ready и errors, посчитанными во время загрузки.
+    """
     print(f"\n🤖 ТЕСТИРОВАНИЕ МОДЕЛЕЙ")
     print("=" * 50)
     
     models_info = []
+    counts = Counter()
     
     for model_file in model_files:
+        counts['total'] += 1
         try:
             print(f"\n📦 Загрузка модели: {os.path.basename(model_file)}")
             
-            with open(model_file, 'rb') as f:
-                model_data = pickle.load(f)
+            model_data = load_model_file(model_file)
+            model_info = {'file': model_file, **classify_model_data(model_data)}
             
             print(f"   Тип данных: {type(model_data)}")
             
@@ -61,7 +149,7 @@ def load_and_test_models(model_files):
                 
                 # Проверяем содержимое
                 for key, value in model_data.items():
-                    if hasattr(value, 'predict'):
+                    if is_model(value):
                         print(f"     {key}: ML модель (можно использовать для прогноза)")
                     elif isinstance(value, (list, tuple)):
                         print(f"     {key}: список/кортеж длиной {len(value)}")
@@ -70,30 +158,18 @@ def load_and_test_models(model_files):
                     else:
                         print(f"     {key}: {type(value).__name__}")
                 
-                models_info.append({
-                    'file': model_file,
-                    'type': 'dict',
-                    'keys': list(model_data.keys()),
-                    'has_ml_models': any(hasattr(v, 'predict') for v in model_data.values() if hasattr(v, '__iter__'))
-                })
+                models_info.append(model_info)
                 
-            elif hasattr(model_data, 'predict'):
+            elif model_info['type'] == 'ml_model':
                 print(f"   ✅ ML модель готова к использованию")
                 print(f"   Методы: {[method for method in dir(model_data) if not method.startswith('_')]}")
                 
-                models_info.append({
-                    'file': model_file,
-                    'type': 'ml_model',
-                    'ready': True
-                })
+                models_info.append(model_info)
+                counts['ready'] += 1
                 
             else:
                 print(f"   ⚠️ Неизвестный тип данных")
-                models_info.append({
-                    'file': model_file,
-                    'type': 'unknown',
-                    'ready': False
-                })
+                models_info.append(model_info)
                 
         except Exception as e:
             print(f"   ❌ Ошибка загрузки: {e}")
@@ -101,48 +177,46 @@ def load_and_test_models(model_files):
                 'file': model_file,
                 'error': str(e)
             })
+            counts['errors'] += 1
     
-    return models_info
+    return models_info, counts
 
 def check_performance_data(csv_files):
-    """Проверка данных о производительности моделей"""
+    """Проверка данных о производительности моделей (csv_files уже отфильтрованы)"""
     print(f"\n📊 ПРОВЕРКА ДАННЫХ О ПРОИЗВОДИТЕЛЬНОСТИ")
     print("=" * 50)
     
     performance_data = {}
     
     for csv_file in csv_files:
-        if 'performance' in csv_file.lower() or 'accuracy' in csv_file.lower():
-            try:
-                print(f"\n📈 Файл производительности: {os.path.basename(csv_file)}")
-                
-                df = pd.read_csv(csv_file)
-                print(f"   Размер: {df.shape}")
-                print(f"   Колонки: {list(df.columns)}")
-                
-                if not df.empty:
-                    print(f"   Первые строки:")
-                    print(df.head().to_string())
-                    
-                    # Анализируем метрики
-                    if 'accuracy' in df.columns or 'r2' in df.columns:
-                        accuracy_col = 'accuracy' if 'accuracy' in df.columns else 'r2'
-                        if accuracy_col in df.columns:
-                            avg_accuracy = df[accuracy_col].mean()
-                            print(f"   Средняя точность ({accuracy_col}): {avg_accuracy:.4f}")
-                    
-                    if 'mae' in df.columns:
-                        avg_mae = df['mae'].mean()
-                        print(f"   Средняя MAE: {avg_mae:.4f}")
+        try:
+            print(f"\n📈 Файл производительности: {os.path.basename(csv_file)}")
+            
+            summary = _scan_csv(csv_file)
+            stats = summary['summary_stats']
+            print(f"   Размер: {summary['shape']}")
+            print(f"   Колонки: {summary['columns']}")
+            
+            if summary['head']:
+                print(f"   Первые строки:")
+                _print_head(summary)
                 
-                performance_data[os.path.basename(csv_file)] = {
-                    'shape': df.shape,
-                    'columns': list(df.columns),
-                    'data': df.to_dict('records') if not df.empty else []
-                }
+                # Анализируем метрики
+                accuracy_col = 'accuracy' if 'accuracy' in stats else 'r2'
+                if accuracy_col in stats:
+                    print(f"   Средняя точность ({accuracy_col}): {stats[accuracy_col]['mean']:.4f}")
                 
-            except Exception as e:
-                print(f"   ❌ Ошибка чтения: {e}")
+                if 'mae' in stats:
+                    print(f"   Средняя MAE: {stats['mae']['mean']:.4f}")
+            
+            performance_data[os.path.basename(csv_file)] = {
+                'shape': summary['shape'],
+                'columns': summary['columns'],
+                'summary_stats': stats
+            }
+            
+        except Exception as e:
+            print(f"   ❌ Ошибка чтения: {e}")
     
     return performance_data
 
@@ -154,49 +228,45 @@ def check_stock_data(csv_files):
     stock_data = {}
     
     for csv_file in csv_files:
-        if 'stock' in csv_file.lower():
-            try:
-                print(f"\n🏭 Файл запасов: {os.path.basename(csv_file)}")
-                
-                df = pd.read_csv(csv_file)
-                print(f"   Размер: {df.shape}")
-                print(f"   Колонки: {list(df.columns)}")
-                
-                if not df.empty:
-                    print(f"   Первые строки:")
-                    print(df.head().to_string())
-                    
-                    # Анализируем данные
-                    if 'product_code' in df.columns:
-                        unique_products = df['product_code'].nunique()
-                        print(f"   Уникальных продуктов: {unique_products}")
-                    
-                    if 'stock' in df.columns:
-                        total_stock = df['stock'].sum()
-                        avg_stock = df['stock'].mean()
-                        print(f"   Общий запас: {total_stock:.2f}")
-                        print(f"   Средний запас: {avg_stock:.2f}")
+        try:
+            print(f"\n🏭 Файл запасов: {os.path.basename(csv_file)}")
+            
+            summary = _scan_csv(csv_file)
+            stats = summary['summary_stats']
+            print(f"   Размер: {summary['shape']}")
+            print(f"   Колонки: {summary['columns']}")
+            
+            if summary['head']:
+                print(f"   Первые строки:")
+                _print_head(summary)
                 
-                stock_data[os.path.basename(csv_file)] = {
-                    'shape': df.shape,
-                    'columns': list(df.columns),
-                    'data': df.to_dict('records') if not df.empty else []
-                }
+                # Анализируем данные
+                if summary['unique_products'] is not None:
+                    print(f"   Уникальных продуктов: {summary['unique_products']}")
                 
-            except Exception as e:
-                print(f"   ❌ Ошибка чтения: {e}")
+                if 'stock' in stats:
+                    print(f"   Общий запас: {stats['stock']['sum']:.2f}")
+                    print(f"   Средний запас: {stats['stock']['mean']:.2f}")
+            
+            stock_data[os.path.basename(csv_file)] = {
+                'shape': summary['shape'],
+                'columns': summary['columns'],
+                'summary_stats': stats
+            }
+            
+        except Exception as e:
+            print(f"   ❌ Ошибка чтения: {e}")
     
     return stock_data
 
-def generate_summary_report(models_info, performance_data, stock_data):
+def generate_summary_report(models_info, model_counts, performance_data, stock_data):
     """Генерация итогового отчета"""
     print(f"\n📋 ИТОГОВЫЙ ОТЧЕТ")
     print("=" * 50)
     
     # Подсчитываем статистику
-    total_models = len([m for m in models_info if m.get('ready', False)])
-    total_files = len(models_info)
-    ready_models = len([m for m in models_info if m.get('ready', False)])
+    total_files = model_counts['total']
+    ready_models = model_counts['ready']
     
     print(f"📊 СТАТИСТИКА:")
     print(f"   Всего файлов моделей: {total_files}")
@@ -232,6 +302,7 @@ def generate_summary_report(models_info, performance_data, stock_data):
         'summary': {
             'total_model_files': total_files,
             'ready_models': ready_models,
+            'load_errors': model_counts['errors'],
             'performance_files': len(performance_data),
             'stock_files': len(stock_data)
         },
@@ -240,8 +311,7 @@ def generate_summary_report(models_info, performance_data, stock_data):
         'stock_data': stock_data
     }
     
-    with open('ml_models_local_check.json', 'w', encoding='utf-8') as f:
-        json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+    save_json(report, 'ml_models_local_check.json')
     
     print(f"\n💾 Отчет сохранен в файл: ml_models_local_check.json")
 
@@ -262,16 +332,19 @@ def main():
         return
     
     # 2. Тестируем модели
-    models_info = load_and_test_models(model_files)
+    models_info, model_counts = load_and_test_models(model_files)
     
     # 3. Проверяем данные о производительности
-    performance_data = check_performance_data(csv_files)
+    performance_data = check_performance_data(csv_files['performance'])
     
     # 4. Проверяем данные о запасах
-    stock_data = check_stock_data(csv_files)
+    stock_data = check_stock_data(csv_files['stock'])
     
     # 5. Генерируем отчет
-    generate_summary_report(models_info, performance_data, stock_data)
+    generate_summary_report(models_info, model_counts, performance_data, stock_data)
 
 if __name__ == "__main__":
+    # Блочная буферизация stdout вместо построчной: вывод идет большими записями
+    if hasattr(sys.stdout, 'reconfigure'):
+        sys.stdout.reconfigure(line_buffering=False, write_through=False)
     main()
@@ -3,14 +3,75 @@
 Проверка статуса ML-моделей
 """
 
+import argparse
+import csv
 import os
-import pickle
+import sys
 import pandas as pd
 from datetime import datetime
 import json
+import pickle
+
+from ml_model_inspect import load_model_file, pickle_protocol, reoptimize_pickle
+
+try:
+    import pyarrow
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:
+    pyarrow = None
 
-def check_models_status():
-    """Проверка статуса ML-моделей"""
+def _present(columns, available):
+    """Запрошенные колонки, которые есть в файле (в порядке запроса)"""
+    return [c for c in columns if c in set(available)]
+
+def _csv_header(path):
+    """Имена колонок CSV по первой строке"""
+    with open(path, newline='', encoding='utf-8') as f:
+        return next(csv.reader(f), [])
+
+def _read_csv(path, columns=None):
+    """Чтение CSV через pyarrow с выборкой колонок и parquet-кешем рядом с файлом
+    
+    Отсутствующие в файле колонки из columns пропускаются.
+    """
+    parquet_path = f"{path}.parquet"
+    if pyarrow is not None:
+        if columns:
+            columns = _present(columns, _csv_header(path))
+        if (os.path.exists(parquet_path) and os.path.getmtime(parquet_path) >= os.path.getmtime(path)
+                and set(columns or ()) <= set(pq.read_schema(parquet_path).names)):
+            return pd.read_parquet(parquet_path, columns=columns)
+        
+        # Лишние колонки отбрасываются при разборе CSV, а не после чтения.
+        # Пустой include_columns в pyarrow означает "все колонки", поэтому [] обрабатываем отдельно
+        if columns is not None and not columns:
+            return pd.DataFrame()
+        table = pa_csv.read_csv(path, convert_options=pa_csv.ConvertOptions(include_columns=columns))
+        try:
+            pq.write_table(table, parquet_path)
+        except Exception:
+            # Кеш необязателен: ошибки записи не должны ломать чтение CSV
+            if os.path.exists(parquet_path):
+                os.remove(parquet_path)
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    
+    if columns:
+        wanted = set(columns)
+        return pd.read_csv(path, usecols=lambda c: c in wanted)
+    return pd.read_csv(path)
+
+# Колонки, которые реально используются при проверке
+PERFORMANCE_COLUMNS = ['model', 'mae', 'r2', 'accuracy']
+CONSUMPTION_COLUMNS = ['product_code', 'start_date']
+STOCK_COLUMNS = ['product_code']
+
+def check_models_status(optimize_pickles: bool = False):
+    """Проверка статуса ML-моделей
+    
+    При optimize_pickles файлы моделей со старым протоколом pickle
+    пересохраняются рядом в <файл>.opt.
+    """
     
     print("🔍 ПРОВЕРКА СТАТУСА ML-МОДЕЛЕЙ")
     print("=" * 50)
@@ -25,11 +86,18 @@ def check_models_status():
         "production_stock_data.csv": "data/production_stock_data.csv"
     }
     
+    # Размеры файлов берем из одного прохода по директории
+    sizes = {}
+    if os.path.isdir("data"):
+        with os.scandir("data") as entries:
+            for entry in entries:
+                if entry.name in model_files and entry.is_file():
+                    sizes[entry.name] = entry.stat().st_size
+    
     models_found = 0
-    for name, path in model_files.items():
-        if os.path.exists(path):
-            size = os.path.getsize(path)
-            size_mb = size / (1024 * 1024)
+    for name in model_files:
+        if name in sizes:
+            size_mb = sizes[name] / (1024 * 1024)
             print(f"✅ {name}: {size_mb:.2f} MB")
             models_found += 1
         else:
@@ -42,13 +110,19 @@ def check_models_status():
     
     if os.path.exists("data/universal_model_performance.csv"):
         try:
-            performance_df = pd.read_csv("data/universal_model_performance.csv")
+            performance_df = _read_csv("data/universal_model_performance.csv", PERFORMANCE_COLUMNS)
             print("📈 Метрики производительности:")
-            for _, row in performance_df.iterrows():
-                model = row['model']
-                mae = row['mae']
-                r2 = row['r2']
-                print(f"   • {model}: MAE={mae:.4f}, R²={r2:.4f}")
+            lines = [
+                f"   • {model}: MAE={mae:.4f}, R²={r2:.4f}"
+                for model, mae, r2 in performance_df[['model', 'mae', 'r2']].itertuples(index=False, name=None)
+            ]
+            print('\n'.join(lines))
+            
+            # Средние метрики одной векторной редукцией по всем колонкам
+            metric_columns = [c for c in ('accuracy', 'r2', 'mae') if c in performance_df.columns]
+            if metric_columns and not performance_df.empty:
+                means = performance_df[metric_columns].to_numpy(dtype=float).mean(axis=0)
+                print("   Среднее: " + ", ".join(f"{c}={m:.4f}" for c, m in zip(metric_columns, means)))
         except Exception as e:
             print(f"❌ Ошибка чтения метрик: {e}")
     
@@ -57,7 +131,7 @@ def check_models_status():
     
     if os.path.exists("data/accurate_consumption_results.csv"):
         try:
-            consumption_df = pd.read_csv("data/accurate_consumption_results.csv")
+            consumption_df = _read_csv("data/accurate_consumption_results.csv", CONSUMPTION_COLUMNS)
             print(f"📊 Данные потребления: {len(consumption_df)} записей")
             print(f"   • Продукты: {consumption_df['product_code'].nunique()}")
             print(f"   • Период: {consumption_df['start_date'].min()} - {consumption_df['start_date'].max()}")
@@ -67,7 +141,7 @@ def check_models_status():
     # Проверка данных о запасах
     if os.path.exists("data/production_stock_data.csv"):
         try:
-            stock_df = pd.read_csv("data/production_stock_data.csv")
+            stock_df = _read_csv("data/production_stock_data.csv", STOCK_COLUMNS)
             print(f"📦 Данные о запасах: {len(stock_df)} записей")
             if 'product_code' in stock_df.columns:
                 print(f"   • Продукты: {stock_df['product_code'].nunique()}")
@@ -79,8 +153,7 @@ def check_models_status():
     
     if os.path.exists("data/universal_forecast_models.pkl"):
         try:
-            with open("data/universal_forecast_models.pkl", "rb") as f:
-                models = pickle.load(f)
+            models = load_model_file("data/universal_forecast_models.pkl")
             
             if isinstance(models, dict):
                 print(f"✅ Загружено моделей: {len(models)}")
@@ -94,6 +167,17 @@ def check_models_status():
                 
         except Exception as e:
             print(f"❌ Ошибка загрузки моделей: {e}")
+        
+        protocol = pickle_protocol("data/universal_forecast_models.pkl")
+        if protocol < pickle.HIGHEST_PROTOCOL:
+            print(f"   ⚠️ Файл сохранен с протоколом pickle {protocol}")
+            if optimize_pickles:
+                try:
+                    output_path = "data/universal_forecast_models.pkl.opt"
+                    reoptimize_pickle("data/universal_forecast_models.pkl", output_path)
+                    print(f"   🔧 Оптимизированная копия: {output_path}")
+                except Exception as e:
+                    print(f"   ❌ Ошибка пересохранения: {e}")
     
     # Общая оценка
     print("\n5️⃣ ОБЩАЯ ОЦЕНКА:")
@@ -115,4 +199,12 @@ def check_models_status():
     print(f"\n📅 Проверка выполнена: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
 if __name__ == "__main__":
-    check_models_status() 
\ No newline at end of file
+    # Блочная буферизация stdout вместо построчной: вывод идет большими записями
+    if hasattr(sys.stdout, 'reconfigure'):
+        sys.stdout.reconfigure(line_buffering=False, write_through=False)
+    
+    parser = argparse.ArgumentParser(description="Проверка статуса ML-моделей")
+    parser.add_argument('--optimize-pickles', action='store_true',
+                        help='пересохранить модели со старым протоколом pickle в <файл>.opt')
+    args = parser.parse_args()
+    check_models_status(optimize_pickles=args.optimize_pickles) 
\ No newline at end of file
@@ -4,15 +4,26 @@
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+import http.client
 import json
 import os
+import socket
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Dict, Any
 
+from ml_model_inspect import save_json
+
+# Общая keep-alive сессия с пулом соединений к ML-сервису
+SESSION = requests.Session()
+SESSION.mount('http://', HTTPAdapter(pool_connections=16, pool_maxsize=16))
+
 def check_ml_service_health():
     """Проверка здоровья ML-сервиса"""
     try:
-        response = requests.get("http://localhost:8002/health", timeout=5)
+        response = SESSION.get("http://localhost:8002/health", timeout=5)
         if response.status_code == 200:
             health_data = response.json()
             print("✅ ML-сервис здоров")
@@ -31,7 +42,7 @@ def check_ml_service_health():
 def get_models_status():
     """Получение статуса всех моделей"""
     try:
-        response = requests.get("http://localhost:8002/models/status", timeout=5)
+        response = SESSION.get("http://localhost:8002/models/status", timeout=5)
         if response.status_code == 200:
             return response.json()
         else:
@@ -41,11 +52,11 @@ def get_models_status():
         print(f"❌ Ошибка получения статуса моделей: {e}")
         return None
 
-def get_model_performance(product_id: str):
+def get_model_performance(session: requests.Session, product_id: str):
     """Получение производительности модели для конкретного продукта"""
     try:
         url = f"http://localhost:8002/models/{product_id}/performance"
-        response = requests.get(url, timeout=5)
+        response = session.get(url, timeout=5)
         if response.status_code == 200:
             return response.json()
         else:
@@ -55,7 +66,7 @@ def get_model_performance(product_id: str):
         print(f"❌ Ошибка получения производительности: {e}")
         return None
 
-def test_forecast(product_id: str = "30001"):
+def test_forecast(session: requests.Session, product_id: str = "30001"):
     """Тестирование прогноза для продукта"""
     try:
         forecast_request = {
@@ -64,7 +75,7 @@ def test_forecast(product_id: str = "30001"):
             "model_type": None
         }
         
-        response = requests.post(
+        response = session.post(
             "http://localhost:8002/forecast", 
             json=forecast_request, 
             timeout=10
@@ -86,29 +97,55 @@ def check_models_directory():
         print(f"❌ Директория моделей не найдена: {models_dir}")
         return []
     
-    model_files = []
-    for filename in os.listdir(models_dir):
-        if filename.endswith('.pkl') or filename.endswith('.joblib'):
-            model_files.append(filename)
+    with os.scandir(models_dir) as entries:
+        return [
+            entry.name for entry in entries
+            if entry.is_file(follow_symlinks=False) and entry.name.endswith(('.pkl', '.joblib'))
+        ]
+
+DOCKER_SOCKET = "/var/run/docker.sock"
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP-соединение с Docker Engine API через unix-сокет"""
+    
+    def __init__(self, socket_path: str, timeout: float = 5):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
     
-    return model_files
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+def _list_running_ml_containers() -> list:
+    """Запущенные контейнеры ml-service (Docker SDK или Engine API напрямую)"""
+    filters = {"name": ["ml-service"], "status": ["running"]}
+    try:
+        import docker
+    except ImportError:
+        docker = None
+    
+    if docker is not None:
+        return docker.from_env().containers.list(filters=filters)
+    
+    connection = _UnixHTTPConnection(DOCKER_SOCKET)
+    try:
+        connection.request("GET", "/containers/json?filters=" + quote(json.dumps(filters)))
+        response = connection.getresponse()
+        if response.status != 200:
+            raise RuntimeError(f"Docker API вернул {response.status}")
+        return json.loads(response.read())
+    finally:
+        connection.close()
 
 def check_docker_containers():
     """Проверка Docker контейнеров"""
     try:
-        import subprocess
-        result = subprocess.run(['docker', 'ps'], capture_output=True, text=True)
-        if result.returncode == 0:
-            lines = result.stdout.strip().split('\n')
-            ml_service_found = any('ml-service' in line for line in lines)
-            if ml_service_found:
-                print("✅ ML-сервис запущен в Docker")
-                return True
-            else:
-                print("❌ ML-сервис не найден в запущенных контейнерах")
-                return False
+        if _list_running_ml_containers():
+            print("✅ ML-сервис запущен в Docker")
+            return True
         else:
-            print("❌ Ошибка проверки Docker контейнеров")
+            print("❌ ML-сервис не найден в запущенных контейнерах")
             return False
     except Exception as e:
         print(f"❌ Ошибка проверки Docker: {e}")
@@ -169,18 +206,29 @@ def main():
     print("\n5️⃣ Тестирование прогноза...")
     test_products = ["30001", "30002", "60001", "360360"]
     
+    # Запросы по продуктам выполняем параллельно
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        performance_futures = {
+            product_id: executor.submit(get_model_performance, SESSION, product_id)
+            for product_id in test_products
+        }
+        forecast_futures = {
+            product_id: executor.submit(test_forecast, SESSION, product_id)
+            for product_id in test_products
+        }
+    
     for product_id in test_products:
         print(f"\n   Тестирование продукта {product_id}...")
         
         # Получаем производительность модели
-        performance = get_model_performance(product_id)
+        performance = performance_futures[product_id].result()
         if performance:
             print(f"     Производительность:")
             for perf in performance:
                 print(f"       {perf['model_type']}: точность {perf['accuracy']:.2%}")
         
         # Тестируем прогноз
-        forecast = test_forecast(product_id)
+        forecast = forecast_futures[product_id].result()
         if forecast:
             print(f"     Прогноз:")
             print(f"       Дневной спрос: {forecast.get('daily_demand', 0):.2f}")
@@ -201,19 +249,15 @@ def main():
         "test_results": {}
     }
     
-    # Добавляем результаты тестов
+    # Добавляем уже полученные результаты тестов
     for product_id in test_products:
-        performance = get_model_performance(product_id)
-        forecast = test_forecast(product_id)
-        
         results["test_results"][product_id] = {
-            "performance": performance,
-            "forecast": forecast
+            "performance": performance_futures[product_id].result(),
+            "forecast": forecast_futures[product_id].result()
         }
     
     # Сохраняем в файл
-    with open('ml_models_status_simple.json', 'w', encoding='utf-8') as f:
-        json.dump(results, f, ensure_ascii=False, indent=2, default=str)
+    save_json(results, 'ml_models_status_simple.json')
     
     print("✅ Результаты сохранены в файл: ml_models_status_simple.json")
     
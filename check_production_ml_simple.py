@@ -3,17 +3,73 @@
 Простая проверка ML моделей в продакшене
 """
 
-import requests
-import json
+import asyncio
+import httpx
 import sys
+import time
 from datetime import datetime
 
-def check_production_ml_status():
+from ml_model_inspect import json_loads, save_json
+
+# Короткий таймаут на установку соединения: недоступный сервис отсекается за 1 с
+TIMEOUTS = httpx.Timeout(5.0, connect=1.0)
+FORECAST_TIMEOUTS = httpx.Timeout(10.0, connect=1.0)
+
+def create_client():
+    """Асинхронный HTTP-клиент с общим пулом keep-alive соединений"""
+    return httpx.AsyncClient(
+        timeout=TIMEOUTS,
+        limits=httpx.Limits(max_keepalive_connections=16)
+    )
+
+# Кэш ответов GET-запросов: url -> (время получения, response)
+_CACHE = {}
+
+async def cached_get(client, url, ttl=10):
+    """GET-запрос с коротким TTL-кэшем, чтобы не опрашивать сервис повторно"""
+    now = time.monotonic()
+    entry = _CACHE.get(url)
+    if entry and now - entry[0] < ttl:
+        return entry[1]
+    response = await client.get(url)
+    _CACHE[url] = (now, response)
+    return response
+
+async def _probe(client, url):
+    """GET-запрос к сервису; возвращает (response, error)"""
+    try:
+        return await cached_get(client, url), None
+    except httpx.HTTPError as e:
+        return None, e
+
+async def _forecast(client, url, product_code):
+    """Запрос прогноза; возвращает (url, product_code, результат или None)"""
+    try:
+        response = await client.post(
+            f"{url}/forecast",
+            json={"product_code": product_code, "forecast_days": 30},
+            timeout=FORECAST_TIMEOUTS
+        )
+        if response.status_code == 200:
+            return url, product_code, json_loads(response.content)
+    except (httpx.HTTPError, ValueError):
+        pass
+    return url, product_code, None
+
+async def check_production_ml_status():
+    """Проверка статуса ML моделей в продакшене"""
+    async with create_client() as client:
+        return await run_checks(client)
+
+async def run_checks(client):
     """Проверка статуса ML моделей в продакшене"""
     
-    print("🔍 ПРОВЕРКА ML-МОДЕЛЕЙ В ПРОДАКШНЕ")
-    print("=" * 50)
-    print(f"📅 Время проверки: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    checked_at = datetime.now()
+    sys.stdout.write(
+        "🔍 ПРОВЕРКА ML-МОДЕЛЕЙ В ПРОДАКШНЕ\n"
+        + "=" * 50 + "\n"
+        + f"📅 Время проверки: {checked_at.strftime('%Y-%m-%d %H:%M:%S')}\n"
+    )
     
     # Конфигурация продакшена
     PRODUCTION_URLS = [
@@ -28,16 +84,18 @@ def check_production_ml_status():
     print("\n1️⃣ ПРОВЕРКА ДОСТУПНОСТИ СЕРВИСОВ")
     print("-" * 40)
     
-    for url in PRODUCTION_URLS:
-        try:
-            response = requests.get(f"{url}/health", timeout=5)
-            if response.status_code == 200:
-                print(f"✅ {url} - доступен")
-                working_services.append(url)
-            else:
-                print(f"❌ {url} - недоступен (код: {response.status_code})")
-        except requests.exceptions.RequestException as e:
-            print(f"❌ {url} - недоступен (ошибка: {e})")
+    # Опрашиваем все сервисы одновременно, выводим в исходном порядке.
+    # GET через кэш: FastAPI отвечает на HEAD кодом 405, а ответ /health нужен еще на шаге 3
+    probes = await asyncio.gather(*(_probe(client, f"{url}/health") for url in PRODUCTION_URLS))
+    
+    for url, (response, error) in zip(PRODUCTION_URLS, probes):
+        if error is not None:
+            print(f"❌ {url} - недоступен (ошибка: {error})")
+        elif response.status_code == 200:
+            print(f"✅ {url} - доступен")
+            working_services.append(url)
+        else:
+            print(f"❌ {url} - недоступен (код: {response.status_code})")
     
     if not working_services:
         print("\n❌ Нет доступных ML-сервисов!")
@@ -52,15 +110,16 @@ def check_production_ml_status():
     print("-" * 40)
     
     models_status = None
-    for url in working_services:
-        try:
-            response = requests.get(f"{url}/models/status", timeout=5)
-            if response.status_code == 200:
-                models_status = response.json()
-                print(f"✅ Статус моделей получен с {url}")
-                break
-        except:
-            continue
+    probes = await asyncio.gather(*(_probe(client, f"{url}/models/status") for url in working_services))
+    
+    for url, (response, error) in zip(working_services, probes):
+        if error is None and response.status_code == 200:
+            try:
+                models_status = json_loads(response.content)
+            except ValueError:
+                continue
+            print(f"✅ Статус моделей получен с {url}")
+            break
     
     if models_status:
         print(f"📊 СТАТУС МОДЕЛЕЙ:")
@@ -82,9 +141,10 @@ def check_production_ml_status():
     models_loaded = 0
     for url in working_services:
         try:
-            response = requests.get(f"{url}/health", timeout=5)
+            # Ответ уже получен на шаге 1 и берется из кэша
+            response = await cached_get(client, f"{url}/health")
             if response.status_code == 200:
-                health_data = response.json()
+                health_data = json_loads(response.content)
                 if 'models_loaded' in health_data:
                     models_loaded = health_data['models_loaded']
                     print(f"✅ {url}: загружено моделей: {models_loaded}")
@@ -99,35 +159,30 @@ def check_production_ml_status():
     test_products = ["30001", "60800", "360360"]
     forecast_working = False
     
-    for url in working_services:
-        for product_code in test_products:
-            try:
-                forecast_data = {
-                    "product_code": product_code,
-                    "forecast_days": 30
-                }
-                
-                response = requests.post(
-                    f"{url}/forecast",
-                    json=forecast_data,
-                    timeout=10
-                )
-                
-                if response.status_code == 200:
-                    forecast_result = response.json()
-                    print(f"✅ Прогноз работает на {url}")
-                    print(f"   Продукт {product_code}:")
-                    print(f"     Потребление: {forecast_result.get('forecast_consumption', 'N/A')}")
-                    print(f"     Рекомендуемый заказ: {forecast_result.get('recommended_order', 'N/A')}")
-                    print(f"     Дней до OoS: {forecast_result.get('days_until_oos', 'N/A')}")
-                    forecast_working = True
-                    break
-                    
-            except Exception as e:
+    # Все комбинации сервис/товар запускаются сразу, берем первый успешный ответ
+    tasks = [
+        asyncio.ensure_future(_forecast(client, url, product_code))
+        for url in working_services for product_code in test_products
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            url, product_code, forecast_result = await next_done
+            if forecast_result is None:
                 continue
-        
-        if forecast_working:
+            
+            print(
+                f"✅ Прогноз работает на {url}\n"
+                f"   Продукт {product_code}:\n"
+                f"     Потребление: {forecast_result.get('forecast_consumption', 'N/A')}\n"
+                f"     Рекомендуемый заказ: {forecast_result.get('recommended_order', 'N/A')}\n"
+                f"     Дней до OoS: {forecast_result.get('days_until_oos', 'N/A')}"
+            )
+            forecast_working = True
             break
+    finally:
+        # Остальные запросы больше не нужны
+        for task in tasks:
+            task.cancel()
     
     if not forecast_working:
         print("❌ Прогнозирование не работает")
@@ -162,23 +217,29 @@ def check_production_ml_status():
     print(f"\n6️⃣ РЕКОМЕНДАЦИИ")
     print("-" * 40)
     
+    lines = []
     if models_loaded == 0:
-        print("🚀 Для обучения моделей:")
-        print("   1. Проверьте наличие исторических данных:")
-        print("      docker exec forecast-api ls -la /app/data/")
-        print("   2. Запустите обучение:")
-        print("      docker exec forecast-api python3 train_models_in_container.py")
-        print("   3. Проверьте логи обучения:")
-        print("      docker-compose logs forecast-api")
-    
-    print("🔧 Для диагностики:")
-    print("   1. Статус контейнеров: docker ps")
-    print("   2. Логи сервисов: docker-compose logs")
-    print("   3. Файлы в контейнере: docker exec forecast-api ls -la /app/data/")
+        lines += [
+            "🚀 Для обучения моделей:",
+            "   1. Проверьте наличие исторических данных:",
+            "      docker exec forecast-api ls -la /app/data/",
+            "   2. Запустите обучение:",
+            "      docker exec forecast-api python3 train_models_in_container.py",
+            "   3. Проверьте логи обучения:",
+            "      docker-compose logs forecast-api",
+        ]
+    
+    lines += [
+        "🔧 Для диагностики:",
+        "   1. Статус контейнеров: docker ps",
+        "   2. Логи сервисов: docker-compose logs",
+        "   3. Файлы в контейнере: docker exec forecast-api ls -la /app/data/",
+    ]
+    sys.stdout.write('\n'.join(lines) + '\n')
     
     # Сохраняем отчет
     report = {
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": checked_at.isoformat(),
         "working_services": working_services,
         "models_loaded": models_loaded,
         "models_status": models_status,
@@ -189,8 +250,7 @@ def check_production_ml_status():
         }
     }
     
-    with open('production_ml_status.json', 'w', encoding='utf-8') as f:
-        json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+    save_json(report, 'production_ml_status.json')
     
     print(f"\n💾 Отчет сохранен в файл: production_ml_status.json")
     
@@ -198,7 +258,7 @@ def check_production_ml_status():
 
 if __name__ == "__main__":
     try:
-        check_production_ml_status()
+        asyncio.run(check_production_ml_status())
     except KeyboardInterrupt:
         print("\n\n❌ Проверка прервана пользователем")
         sys.exit(1)
@@ -4,15 +4,34 @@
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
+import os
+import re
+import subprocess
 import sys
 from datetime import datetime
 import time
 
+from ml_model_inspect import json_loads
+
+# Общая keep-alive сессия: соединение с API переиспользуется между проверками
+SESSION = requests.Session()
+SESSION.headers.update({"Connection": "keep-alive"})
+_adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16,
+                       max_retries=Retry(total=2, connect=0, backoff_factor=0.2))
+
+# (connect, read): недоступный API отсекается за 1 с, а не за весь таймаут чтения
+TIMEOUTS = (1.0, 10.0)
+FORECAST_TIMEOUTS = (1.0, 15.0)
+SESSION.mount('http://', _adapter)
+SESSION.mount('https://', _adapter)
+
 def check_api_health(base_url="http://localhost:8001"):
     """Проверка здоровья API"""
     try:
-        response = requests.get(f"{base_url}/health", timeout=10)
+        response = SESSION.get(f"{base_url}/health", timeout=TIMEOUTS)
         if response.status_code == 200:
             print("✅ API доступен")
             return True
@@ -23,19 +42,61 @@ def check_api_health(base_url="http://localhost:8001"):
         print(f"❌ Ошибка подключения к API: {e}")
         return False
 
+# Валидаторы и тело последнего ответа /models/status сохраняются между запусками
+ETAG_CACHE_PATH = os.path.join(".cache", "etag.json")
+
+def _load_etag_cache():
+    """Чтение кэша условных запросов"""
+    try:
+        with open(ETAG_CACHE_PATH, 'rb') as f:
+            return json_loads(f.read())
+    except (OSError, ValueError):
+        return {}
+
+def _save_etag_cache(cache):
+    """Запись кэша условных запросов"""
+    os.makedirs(os.path.dirname(ETAG_CACHE_PATH), exist_ok=True)
+    with open(ETAG_CACHE_PATH, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False)
+
 def check_models_status(base_url="http://localhost:8001"):
     """Проверка статуса моделей"""
+    url = f"{base_url}/models/status"
+    etag_cache = _load_etag_cache()
+    cached = etag_cache.get(url)
+    
+    # Условный запрос: при неизменном статусе сервер вернет 304 без тела
+    headers = {}
+    if cached:
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+    
     try:
-        response = requests.get(f"{base_url}/models/status", timeout=10)
-        if response.status_code == 200:
-            data = response.json()
+        response = SESSION.get(url, headers=headers, timeout=TIMEOUTS)
+        if response.status_code == 304 and cached:
+            data = cached['body']
+            print("✅ Статус моделей не изменился (304 Not Modified)")
+        elif response.status_code == 200:
+            data = json_loads(response.content)
             print("✅ Статус моделей получен")
-            print(f"📊 Ответ: {json.dumps(data, indent=2, ensure_ascii=False)}")
-            return data
+            
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if etag or last_modified:
+                etag_cache[url] = {'etag': etag, 'last_modified': last_modified, 'body': data}
+                try:
+                    _save_etag_cache(etag_cache)
+                except OSError:
+                    pass
         else:
             print(f"❌ Ошибка получения статуса моделей: {response.status_code}")
             return None
-    except requests.exceptions.RequestException as e:
+        
+        print(f"📊 Ответ: {json.dumps(data, indent=2, ensure_ascii=False)}")
+        return data
+    except (requests.exceptions.RequestException, ValueError) as e:
         print(f"❌ Ошибка запроса статуса моделей: {e}")
         return None
 
@@ -53,58 +114,97 @@ def test_forecast_api(base_url="http://localhost:8001"):
     for test_data in test_products:
         try:
             print(f"\n📦 Тестируем товар: {test_data['product_code']}")
-            response = requests.post(
+            response = SESSION.post(
                 f"{base_url}/forecast",
                 json=test_data,
-                timeout=15
+                timeout=FORECAST_TIMEOUTS
             )
             
             if response.status_code == 200:
-                result = response.json()
-                print(f"✅ Прогноз получен для товара {test_data['product_code']}")
-                print(f"   Модели: {result.get('models_used', 'не указаны')}")
-                print(f"   Уверенность: {result.get('confidence', 'не указана')}")
-                print(f"   Прогноз потребления: {result.get('forecast_consumption', 'не указан')}")
+                result = json_loads(response.content)
+                print(
+                    f"✅ Прогноз получен для товара {test_data['product_code']}\n"
+                    f"   Модели: {result.get('models_used', 'не указаны')}\n"
+                    f"   Уверенность: {result.get('confidence', 'не указана')}\n"
+                    f"   Прогноз потребления: {result.get('forecast_consumption', 'не указан')}"
+                )
             else:
                 print(f"❌ Ошибка прогноза для товара {test_data['product_code']}: {response.status_code}")
                 print(f"   Ответ: {response.text}")
                 
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, ValueError) as e:
             print(f"❌ Ошибка запроса для товара {test_data['product_code']}: {e}")
 
+def _docker_logs(name):
+    """Запуск docker logs для контейнера без ожидания завершения"""
+    return subprocess.Popen(
+        ['docker', 'logs', name, '--tail', '20'],
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+    )
+
 def check_container_logs():
     """Проверка логов контейнеров (если доступен Docker)"""
     print("\n🐳 Проверка логов контейнеров...")
     
+    processes = {}
     try:
-        import subprocess
-        result = subprocess.run(['docker', 'ps'], capture_output=True, text=True, timeout=10)
-        if result.returncode == 0:
-            print("✅ Docker доступен")
-            
-            # Проверяем логи moysklad-service
-            print("\n📋 Логи moysklad-service:")
-            logs_result = subprocess.run(
-                ['docker', 'logs', 'moysklad-service', '--tail', '20'],
-                capture_output=True, text=True, timeout=15
-            )
-            if logs_result.returncode == 0:
-                print(logs_result.stdout)
+        # docker ps и логи moysklad-service независимы - запускаем одновременно
+        ps = subprocess.Popen(
+            ['docker', 'ps', '--format', '{{.Names}}'],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+        )
+        processes['moysklad-service'] = _docker_logs('moysklad-service')
+        
+        names_output, _ = ps.communicate(timeout=10)
+        if ps.returncode != 0:
+            print("❌ Docker недоступен или контейнеры не запущены")
+            return
+        
+        print("✅ Docker доступен")
+        
+        # Логи остальных контейнеров тоже собираем параллельно
+        for name in names_output.split():
+            if name not in processes:
+                processes[name] = _docker_logs(name)
+        
+        for name, process in processes.items():
+            output, _ = process.communicate(timeout=15)
+            print(f"\n📋 Логи {name}:")
+            if process.returncode == 0:
+                print(output)
             else:
-                print("❌ Не удалось получить логи moysklad-service")
+                print(f"❌ Не удалось получить логи {name}")
                 
-        else:
-            print("❌ Docker недоступен или контейнеры не запущены")
-            
-    except (ImportError, subprocess.TimeoutExpired, FileNotFoundError):
+    except (subprocess.TimeoutExpired, FileNotFoundError):
         print("❌ Docker не установлен или недоступен")
+    finally:
+        for process in processes.values():
+            if process.poll() is None:
+                process.kill()
+
+# Признаки файла модели: расширение или "model" в имени без учета регистра
+MODEL_EXTENSIONS = ('.pkl', '.joblib')
+MODEL_RE = re.compile('model', re.IGNORECASE)
+
+def iter_model_files(path):
+    """Рекурсивный обход папки через os.scandir с отбором файлов моделей"""
+    try:
+        entries = os.scandir(path)
+    except OSError:
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from iter_model_files(entry.path)
+                continue
+            name = entry.name
+            if name.endswith(MODEL_EXTENSIONS) or MODEL_RE.search(name):
+                yield entry.path
 
 def check_file_system():
     """Проверка файловой системы на наличие моделей"""
     print("\n📁 Проверка файловой системы...")
     
-    import os
-    
     # Проверяем основные папки с данными
     data_paths = [
         "./data",
@@ -112,38 +212,36 @@ def check_file_system():
         "./services/ml-service/data"
     ]
     
+    lines = []
     for path in data_paths:
         if os.path.exists(path):
-            print(f"✅ Папка {path} существует")
+            lines.append(f"✅ Папка {path} существует")
             
             # Ищем файлы моделей
-            model_files = []
-            for root, dirs, files in os.walk(path):
-                for file in files:
-                    if file.endswith(('.pkl', '.joblib')) or 'model' in file.lower():
-                        model_files.append(os.path.join(root, file))
+            model_files = list(iter_model_files(path))
             
             if model_files:
-                print(f"   📦 Найдено файлов моделей: {len(model_files)}")
-                for model_file in model_files[:5]:  # Показываем первые 5
-                    print(f"      - {model_file}")
+                lines.append(f"   📦 Найдено файлов моделей: {len(model_files)}")
+                lines.extend(f"      - {model_file}" for model_file in model_files[:5])  # Показываем первые 5
                 if len(model_files) > 5:
-                    print(f"      ... и еще {len(model_files) - 5} файлов")
+                    lines.append(f"      ... и еще {len(model_files) - 5} файлов")
             else:
-                print(f"   ❌ Файлы моделей не найдены")
+                lines.append(f"   ❌ Файлы моделей не найдены")
         else:
-            print(f"❌ Папка {path} не существует")
+            lines.append(f"❌ Папка {path} не существует")
     
     # Проверяем папку real_models
     real_models_path = "./data/real_models"
     if os.path.exists(real_models_path):
-        print(f"✅ Папка {real_models_path} существует")
+        lines.append(f"✅ Папка {real_models_path} существует")
         real_models_files = os.listdir(real_models_path)
-        print(f"   📦 Файлов в real_models: {len(real_models_files)}")
-        for file in real_models_files[:10]:  # Показываем первые 10
-            print(f"      - {file}")
+        lines.append(f"   📦 Файлов в real_models: {len(real_models_files)}")
+        lines.extend(f"      - {file}" for file in real_models_files[:10])  # Показываем первые 10
     else:
-        print(f"❌ Папка {real_models_path} не существует - модели не обучены!")
+        lines.append(f"❌ Папка {real_models_path} не существует - модели не обучены!")
+    
+    # Весь отчет по файловой системе выводим одной записью
+    sys.stdout.write('\n'.join(lines) + '\n')
 
 def main():
     """Основная функция"""
@@ -176,20 +274,25 @@ def main():
     print("📋 РЕКОМЕНДАЦИИ:")
     
     if models_status and models_status.get('total_models', 0) > 0:
-        print("✅ ML модели работают корректно")
+        lines = ["✅ ML модели работают корректно"]
     else:
-        print("❌ ML модели не работают или не обучены")
-        print("   Рекомендуется:")
-        print("   1. Запустить обучение моделей:")
-        print("      ./train_models_in_container.sh")
-        print("   2. Проверить логи контейнеров:")
-        print("      docker logs moysklad-service")
-        print("   3. Убедиться в наличии данных в MoySklad")
-    
-    print("\n🔧 Для детальной диагностики используйте:")
-    print("   - docker logs moysklad-service")
-    print("   - docker logs forecast-api")
-    print("   - ./check_models_status.sh")
+        lines = [
+            "❌ ML модели не работают или не обучены",
+            "   Рекомендуется:",
+            "   1. Запустить обучение моделей:",
+            "      ./train_models_in_container.sh",
+            "   2. Проверить логи контейнеров:",
+            "      docker logs moysklad-service",
+            "   3. Убедиться в наличии данных в MoySklad",
+        ]
+    
+    lines += [
+        "\n🔧 Для детальной диагностики используйте:",
+        "   - docker logs moysklad-service",
+        "   - docker logs forecast-api",
+        "   - ./check_models_status.sh",
+    ]
+    sys.stdout.write('\n'.join(lines) + '\n')
 
 if __name__ == "__main__":
     main()
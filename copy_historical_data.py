@@ -6,6 +6,7 @@
 import os
 import shutil
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 # Настройка логирования
 logging.basicConfig(
@@ -14,6 +15,27 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def copy_file(source_path, dest_path):
+    """Копирует содержимое файла без метаданных (os.sendfile, если доступен)"""
+    with open(source_path, 'rb') as src, open(dest_path, 'wb') as dst:
+        size = os.fstat(src.fileno()).st_size
+        if hasattr(os, 'sendfile'):
+            try:
+                # Данные копируются внутри ядра, без буферов в Python
+                offset = 0
+                while offset < size:
+                    sent = os.sendfile(dst.fileno(), src.fileno(), offset, size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+                return
+            except OSError:
+                # sendfile не поддерживается для этой ФС - копируем обычным способом
+                src.seek(0)
+                dst.seek(0)
+                dst.truncate()
+        shutil.copyfileobj(src, dst, length=4 * 1024 * 1024)
+
 def copy_historical_data():
     """Копирует исторические данные в контейнер"""
     logger.info("📊 Копирование исторических данных...")
@@ -33,23 +55,29 @@ def copy_historical_data():
         "accurate_consumption_results.csv"
     ]
     
-    copied_files = []
+    # Копируем в корень проекта для доступа из контейнера
+    os.makedirs("data", exist_ok=True)
     
-    for file_name in files_to_copy:
+    def _copy_one(file_name):
         source_path = os.path.join(source_dir, file_name)
-        if os.path.exists(source_path):
-            # Копируем в корень проекта для доступа из контейнера
-            dest_path = os.path.join("data", file_name)
-            os.makedirs("data", exist_ok=True)
-            
-            try:
-                shutil.copy2(source_path, dest_path)
-                copied_files.append(file_name)
-                logger.info(f"✅ Скопирован {file_name}")
-            except Exception as e:
-                logger.error(f"❌ Ошибка копирования {file_name}: {e}")
-        else:
+        if not os.path.exists(source_path):
             logger.warning(f"⚠️ Файл {file_name} не найден")
+            return False
+        
+        dest_path = os.path.join("data", file_name)
+        try:
+            copy_file(source_path, dest_path)
+            logger.info(f"✅ Скопирован {file_name}")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Ошибка копирования {file_name}: {e}")
+            return False
+    
+    # Файлы независимы - копируем параллельно, чтобы перекрыть ввод-вывод
+    with ThreadPoolExecutor(max_workers=len(files_to_copy)) as executor:
+        results = list(executor.map(_copy_one, files_to_copy))
+    
+    copied_files = [name for name, ok in zip(files_to_copy, results) if ok]
     
     logger.info(f"📊 Скопировано файлов: {len(copied_files)}")
     return len(copied_files) > 0
@@ -9,12 +9,44 @@ import sys
 import traceback
 from datetime import datetime
 
+try:
+    import joblib
+except ImportError:
+    joblib = None
+
+MODEL_PATH = "data/universal_forecast_models.pkl"
+# joblib-бандлы моделей по товарам (rate_limited_training.py)
+REAL_MODELS_DIR = "data/real_models"
+
+def _load_model_data(path):
+    """Загрузка модели: .joblib через joblib, остальные файлы - обычным pickle"""
+    if path.endswith('.joblib') and joblib is not None:
+        # mmap_mode оставляет на диске массивы NumPy несжатого joblib-файла;
+        # обычные pickle-файлы joblib тоже читает, поэтому запасной ветки не нужно
+        return joblib.load(path, mmap_mode='r')
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+# Результат однократной загрузки модели: (данные, предупреждения)
+_loaded = None
+
+def _load_once():
+    """Загружает файл модели один раз и переиспользует результат во всех проверках"""
+    global _loaded
+    if _loaded is None:
+        import warnings
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter("always")
+            model_data = _load_model_data(MODEL_PATH)
+        _loaded = (model_data, list(w))
+    return _loaded
+
 def check_model_file():
     """Проверка файла модели"""
     print("🔍 ПРОВЕРКА ФАЙЛА МОДЕЛИ")
     print("=" * 40)
     
-    model_path = "data/universal_forecast_models.pkl"
+    model_path = MODEL_PATH
     
     if not os.path.exists(model_path):
         print(f"❌ Файл модели не найден: {model_path}")
@@ -34,13 +66,10 @@ def test_model_loading():
     print("\n🧪 ТЕСТ ЗАГРУЗКИ МОДЕЛИ")
     print("=" * 40)
     
-    model_path = "data/universal_forecast_models.pkl"
-    
     try:
-        print(f"Попытка загрузки модели из: {model_path}")
+        print(f"Попытка загрузки модели из: {MODEL_PATH}")
         
-        with open(model_path, 'rb') as f:
-            model_data = pickle.load(f)
+        model_data, _ = _load_once()
         
         print("✅ Модель успешно загружена!")
         
@@ -70,6 +99,42 @@ def test_model_loading():
         traceback.print_exc()
         return False
 
+def test_joblib_bundles():
+    """Тест загрузки joblib-бандлов моделей из data/real_models"""
+    print("\n📦 ТЕСТ ЗАГРУЗКИ JOBLIB-БАНДЛОВ")
+    print("=" * 40)
+    
+    if joblib is None:
+        print("⚠️  joblib не установлен, проверка пропущена")
+        return True
+    if not os.path.isdir(REAL_MODELS_DIR):
+        print(f"⚠️  Директория бандлов не найдена: {REAL_MODELS_DIR}")
+        return True
+    
+    paths = sorted(os.path.join(REAL_MODELS_DIR, name)
+                   for name in os.listdir(REAL_MODELS_DIR) if name.endswith('.joblib'))
+    if not paths:
+        print(f"⚠️  В {REAL_MODELS_DIR} нет .joblib-файлов")
+        return True
+    
+    ok = True
+    for path in paths:
+        try:
+            import warnings
+            with warnings.catch_warnings():
+                # Для сжатых бандлов joblib предупреждает, что mmap_mode не применяется
+                warnings.simplefilter("ignore")
+                bundle = _load_model_data(path)
+            models = bundle.get('models', {}) if isinstance(bundle, dict) else {}
+            print(f"✅ {os.path.basename(path)}: моделей {len(models)} ({', '.join(models)})")
+            if isinstance(bundle, dict) and bundle.get('product_codes'):
+                print(f"   Общая модель для {len(bundle['product_codes'])} товаров")
+        except Exception as e:
+            print(f"❌ {os.path.basename(path)}: {e}")
+            ok = False
+    
+    return ok
+
 def test_numpy_import():
     """Тест импорта numpy"""
     print("\n📦 ТЕСТ ИМПОРТА NUMPY")
@@ -110,22 +175,15 @@ def test_pickle_security():
         print(f"✅ Pickle доступен")
         print(f"   Версия: {pickle.format_version}")
         
-        # Проверка предупреждений
-        import warnings
-        with warnings.catch_warnings(record=True) as w:
-            warnings.simplefilter("always")
-            
-            # Попытка загрузки модели
-            model_path = "data/universal_forecast_models.pkl"
-            with open(model_path, 'rb') as f:
-                model_data = pickle.load(f)
-            
-            if w:
-                print("⚠️  Предупреждения при загрузке:")
-                for warning in w:
-                    print(f"   {warning.message}")
-            else:
-                print("✅ Загрузка без предупреждений")
+        # Проверка предупреждений (собраны при первой загрузке модели)
+        _, w = _load_once()
+        
+        if w:
+            print("⚠️  Предупреждения при загрузке:")
+            for warning in w:
+                print(f"   {warning.message}")
+        else:
+            print("✅ Загрузка без предупреждений")
         
         return True
         
@@ -147,6 +205,7 @@ def main():
         ("Импорт Scikit-learn", test_sklearn_import),
         ("Безопасность Pickle", test_pickle_security),
         ("Загрузка модели", test_model_loading),
+        ("Бандлы joblib", test_joblib_bundles),
     ]
     
     results = []
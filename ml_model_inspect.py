@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Общие функции проверки файлов ML-моделей для скриптов check_ml_*
+"""
+
+import functools
+import json
+import mmap
+import os
+import pickle
+import pickletools
+from datetime import datetime
+from typing import Any, Dict
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def json_loads(data):
+    """Разбор JSON (orjson, если установлен)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def json_dumps(obj, indent: bool = False) -> bytes:
+    """Сериализация JSON в байты (orjson, если установлен)"""
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False).encode('utf-8')
+
+def _normalize(obj):
+    """Приведение результатов к JSON-совместимым типам за один проход"""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, dict):
+        return {str(k): _normalize(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_normalize(v) for v in obj]
+    return obj
+
+def save_results(results: Dict[str, Any], path: str):
+    """Сохранение результатов проверки в JSON-файл"""
+    results = _normalize(results)
+    if orjson is not None:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE))
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+
+def save_json(data, path: str):
+    """Сохранение отчета в JSON (orjson, если установлен)"""
+    if orjson is not None:
+        options = orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(data, option=options, default=str))
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+
+# Файлы до этого размера читаются в память целиком, более крупные - через mmap
+FAST_UNPICKLE_MAX_BYTES = 256 * 1024 * 1024
+
+def fast_unpickle(path):
+    """Загрузка pickle одним чтением файла вместо множества мелких read()"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size <= FAST_UNPICKLE_MAX_BYTES:
+            return pickle.loads(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return pickle.loads(mm)
+
+@functools.lru_cache(maxsize=None)
+def _load_cached(path, mtime_ns, size):
+    return fast_unpickle(path)
+
+def load_model_file(path):
+    """Загрузка файла модели с кешем по (путь, mtime, размер)
+    
+    Повторный вызов для неизмененного файла стоит только stat.
+    """
+    st = os.stat(path)
+    return _load_cached(path, st.st_mtime_ns, st.st_size)
+
+_ML_BASES = None
+
+def _ml_bases() -> tuple:
+    """Базовые классы моделей из установленных библиотек (определяются один раз)"""
+    global _ML_BASES
+    if _ML_BASES is None:
+        bases = []
+        try:
+            # BaseEstimator не подходит: у трансформеров (StandardScaler) нет predict
+            from sklearn.base import ClassifierMixin, RegressorMixin
+            bases.extend((RegressorMixin, ClassifierMixin))
+        except ImportError:
+            pass
+        try:
+            import xgboost
+            bases.append(xgboost.Booster)
+        except ImportError:
+            pass
+        try:
+            import lightgbm
+            bases.append(lightgbm.Booster)
+        except ImportError:
+            pass
+        _ML_BASES = tuple(bases)
+    return _ML_BASES
+
+# Типы, которые заведомо не являются моделями
+_PLAIN_TYPES = (str, bytes, int, float, bool, list, tuple, dict, set, type(None))
+
+def is_model(value) -> bool:
+    """Есть ли у объекта метод predict
+    
+    Сначала дешевые проверки типа, и только затем hasattr по классу.
+    """
+    if isinstance(value, _PLAIN_TYPES):
+        return False
+    if isinstance(value, _ml_bases()):
+        return True
+    return hasattr(type(value), 'predict')
+
+def classify_model_data(model_data) -> dict:
+    """Классификация загруженных данных: словарь моделей, модель или неизвестный тип"""
+    if isinstance(model_data, dict):
+        return {
+            'type': 'dict',
+            'keys': list(model_data.keys()),
+            'has_ml_models': any(is_model(v) for v in model_data.values())
+        }
+    if is_model(model_data):
+        return {'type': 'ml_model', 'ready': True}
+    return {'type': 'unknown', 'ready': False}
+
+def pickle_protocol(path) -> int:
+    """Протокол pickle по заголовку файла (0 для протоколов без PROTO)"""
+    with open(path, 'rb') as f:
+        header = f.read(2)
+    if len(header) == 2 and header[0] == 0x80:
+        return header[1]
+    return 0
+
+def reoptimize_pickle(path, output_path=None):
+    """Пересохранение pickle с протоколом HIGHEST_PROTOCOL и pickletools.optimize
+    
+    Без output_path файл атомарно заменяется на месте. Возвращает уже
+    загруженные данные, чтобы не читать файл повторно.
+    """
+    output_path = output_path or path
+    data = fast_unpickle(path)
+    buf = pickletools.optimize(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+    
+    tmp_path = f"{output_path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(buf)
+        os.replace(tmp_path, output_path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return data
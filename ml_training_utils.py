@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Общие функции обучения для скриптов train_real_models.py и train_models_in_container.py
+"""
+
+import os
+import pickle
+from typing import Dict
+
+import joblib
+import numpy as np
+
+# Сжатие файлов моделей: lz4, если установлен, иначе zlib.
+# zstd среди компрессоров joblib нет, а бандлы читает joblib.load в сервисах
+try:
+    import lz4  # noqa: F401
+    JOBLIB_COMPRESS = ('lz4', 3)
+except ImportError:
+    JOBLIB_COMPRESS = ('zlib', 3)
+
+def lags_and_mas(q):
+    """Лаги 1/7/30 и скользящие средние 7/30 за один проход по ряду (NaN, пока окна не хватает)"""
+    n = q.shape[0]
+    out = np.full((n, 5), np.nan)
+    sum_7 = 0.0
+    sum_30 = 0.0
+    for i in range(n):
+        sum_7 += q[i]
+        sum_30 += q[i]
+        if i >= 1:
+            out[i, 0] = q[i - 1]
+        if i >= 7:
+            out[i, 1] = q[i - 7]
+            sum_7 -= q[i - 7]
+        if i >= 30:
+            out[i, 2] = q[i - 30]
+            sum_30 -= q[i - 30]
+        if i >= 6:
+            out[i, 3] = sum_7 / 7
+        if i >= 29:
+            out[i, 4] = sum_30 / 30
+    return out
+
+# С numba ядро компилируется в машинный код; без нее выполняется как обычная функция
+try:
+    from numba import njit
+    lags_and_mas = njit(cache=True)(lags_and_mas)
+except ImportError:
+    pass
+
+def save_model_bundle(models_dir: str, product_id: str, models: Dict) -> str:
+    """Модели и скейлеры товара одним сжатым joblib-файлом; возвращает путь к файлу
+
+    Общий для моделей StandardScaler попадает в файл один раз.
+    """
+    bundle_path = os.path.join(models_dir, f"{product_id}.joblib")
+    bundle = {
+        'models': {name: info['model'] for name, info in models.items()},
+        'scalers': {name: info['scaler'] for name, info in models.items() if info['scaler'] is not None},
+        'feature_columns': {name: info['feature_columns'] for name, info in models.items()},
+    }
+    joblib.dump(bundle, bundle_path, compress=JOBLIB_COMPRESS, protocol=pickle.HIGHEST_PROTOCOL)
+    return bundle_path
@@ -8,19 +8,52 @@ import httpx
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
-import json
+from typing import List, Dict, Any, Optional, Set
 import logging
 import time
 import random
-from collections import deque
+import hashlib
+import sqlite3
+from array import array
+
+# Оптимизированные ядра oneDAL для sklearn-оценщиков, если установлен scikit-learn-intelex;
+# патч должен выполниться до импорта классов sklearn
+try:
+    from sklearnex import patch_sklearn
+    patch_sklearn()
+except ImportError:
+    pass
+
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.linear_model import LinearRegression
 from sklearn.preprocessing import StandardScaler
 import pickle
+import joblib
 import os
 from dotenv import load_dotenv
 
+from ml_model_inspect import json_dumps, json_loads
+
+try:
+    import h2  # noqa: F401  (нужен httpx для HTTP/2)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Цикл событий на libuv, если установлен uvloop; asyncio.run ниже подхватит его
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
+# Сжатие файлов моделей: lz4, если установлен, иначе zlib
+try:
+    import lz4  # noqa: F401
+    JOBLIB_COMPRESS = ('lz4', 3)
+except ImportError:
+    JOBLIB_COMPRESS = ('zlib', 3)
+
 # Загружаем переменные окружения
 load_dotenv()
 
@@ -28,6 +61,71 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class ResponseCache:
+    """Локальный кэш ответов MoySklad в SQLite: ключ - SHA256 от (метод, URL, параметры)"""
+
+    def __init__(self, path: str, ttl: float):
+        self.ttl = ttl
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, body BLOB, expires_at REAL)"
+        )
+
+    @staticmethod
+    def key(method: str, url: str, params: Optional[Dict]) -> str:
+        return hashlib.sha256(f"{method}|{url}|{sorted((params or {}).items())}".encode()).hexdigest()
+
+    def get(self, key: str, ignore_ttl: bool = False) -> Optional[bytes]:
+        row = self._db.execute("SELECT body, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or (not ignore_ttl and row[1] < time.time()):
+            return None
+        return row[0]
+
+    def set(self, key: str, body: bytes):
+        self._db.execute(
+            "INSERT OR REPLACE INTO cache (key, body, expires_at) VALUES (?, ?, ?)",
+            (key, body, time.time() + self.ttl),
+        )
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+class StockColumns:
+    """Дневные остатки одного товара по столбцам.
+    Вместо объекта на каждую запись - компактные массивы; DataFrame строится из них один раз.
+    """
+    __slots__ = ('product_code', 'start_date', 'day', 'quantity', 'reserve', 'in_transit')
+
+    def __init__(self, product_code: str, start_date: datetime.date):
+        self.product_code = product_code
+        self.start_date = start_date
+        self.day = array('i')  # смещение в днях от start_date
+        self.quantity = array('d')
+        self.reserve = array('d')
+        self.in_transit = array('d')
+
+    def __len__(self):
+        return len(self.day)
+
+    def append(self, day: datetime.date, row: Dict):
+        self.day.append((day - self.start_date).days)
+        self.quantity.append(row.get('quantity') or 0)
+        self.reserve.append(row.get('reserve') or 0)
+        self.in_transit.append(row.get('inTransit') or 0)
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            'date': np.datetime64(self.start_date, 'D') + np.frombuffer(self.day, dtype=np.int32),
+            'quantity': np.frombuffer(self.quantity, dtype=np.float64),
+            'reserve': np.frombuffer(self.reserve, dtype=np.float64),
+            'inTransit': np.frombuffer(self.in_transit, dtype=np.float64),
+            'product_code': self.product_code,
+        })
+
 class RateLimitedMoySkladCollector:
     """Класс для сбора данных из MoySklad API с учетом ограничений"""
     
@@ -47,47 +145,89 @@ class RateLimitedMoySkladCollector:
         # Настройка лимитов: целимся ниже 200 req/min для запаса
         self.requests_per_minute = int(os.getenv('MSK_REQ_PER_MIN', '180'))
         self.min_delay_between_requests = float(os.getenv('MSK_MIN_DELAY_SEC', '0.30'))
-        self.last_request_time = 0.0
-        self.request_timestamps = deque()  # моменты времени последних запросов (секунды)
+        # GCRA: интервал между запросами и теоретическое время следующего запроса (TAT)
+        self._interval = max(60.0 / self.requests_per_minute, self.min_delay_between_requests)
+        self._tat = 0.0
+        # Допуск всплеска: после простоя до MSK_BURST запросов уходят без ожидания
+        # (эквивалент ведра токенов емкостью MSK_BURST; 1 - строгий интервал между запросами)
+        self._burst_tolerance = (max(1, int(os.getenv('MSK_BURST', '5'))) - 1) * self._interval
+        self._lock = asyncio.Lock()
+        # Одновременных запросов в полете; темп по-прежнему задает _rate_limit
+        self._sem = asyncio.Semaphore(int(os.getenv('MSK_CONCURRENCY', '10')))
+        
+        # Кэш ответов API: enabled - читать и писать, read_only - только читать,
+        # replay - только из кэша без сети (без учета TTL), disabled - не использовать
+        self._cache_mode = os.getenv('MSK_CACHE_MODE', 'disabled')
+        self._cache = None
+        if self._cache_mode in ('enabled', 'read_only', 'replay'):
+            self._cache = ResponseCache(
+                os.getenv('MSK_CACHE_PATH', '.cache/moysklad_responses.sqlite'),
+                ttl=float(os.getenv('MSK_CACHE_TTL_SEC', str(7 * 24 * 3600))),
+            )
+        
+        # Один клиент на весь сбор: TCP/TLS-соединения переиспользуются между запросами.
+        # keepalive_expiry больше пауз между чанками и ожиданий по 429 (по умолчанию httpx - 5 c),
+        # иначе после каждой паузы соединения пришлось бы открывать заново
+        self._client = httpx.AsyncClient(
+            headers=self.headers,
+            timeout=httpx.Timeout(30.0),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=20, keepalive_expiry=300),
+            http2=HTTP2_AVAILABLE,
+        )
+    
+    async def close(self):
+        """Закрытие HTTP-клиента и кэша ответов"""
+        await self._client.aclose()
+        if self._cache is not None:
+            self._cache.close()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
         
     async def _rate_limit(self):
-        """Скользящее окно: не более N запросов за последние 60 секунд + минимальная задержка с джиттером."""
-        now = time.time()
-        # Минимальная задержка между запросами
-        since_last = now - self.last_request_time
-        if since_last < self.min_delay_between_requests:
-            sleep_time = self.min_delay_between_requests - since_last + random.uniform(0.02, 0.12)
-            await asyncio.sleep(sleep_time)
-            now = time.time()
-
-        # Чистим окно старше 60 секунд
-        while self.request_timestamps and now - self.request_timestamps[0] > 60.0:
-            self.request_timestamps.popleft()
-
-        # Если достигли лимита, ждём до освобождения окна
-        if len(self.request_timestamps) >= self.requests_per_minute:
-            sleep_needed = 60.0 - (now - self.request_timestamps[0]) + random.uniform(0.05, 0.15)
-            logger.info(f"⏳ Достигнут лимит {self.requests_per_minute}/мин. Ожидание {sleep_needed:.1f} c...")
-            await asyncio.sleep(max(0.0, sleep_needed))
-
-        # Фиксируем текущий запрос
-        self.last_request_time = time.time()
-        self.request_timestamps.append(self.last_request_time)
+        """GCRA: в среднем не чаще одного запроса за интервал, всплеск - до MSK_BURST запросов;
+        с небольшим джиттером против антибота."""
+        async with self._lock:
+            now = time.monotonic()
+            # Ожидание слота и джиттер 0.02..0.12 c складываются в одну паузу
+            wait = max(0.0, self._tat - self._burst_tolerance - now) + 0.02 + random.random() * 0.1
+            self._tat = max(self._tat, now) + self._interval
+        # Ждем вне блокировки, чтобы остальные запросы успели занять свои слоты
+        await asyncio.sleep(wait)
     
-    async def _make_request(self, method: str, url: str, **kwargs) -> Optional[Dict]:
-        """Выполнение запроса с ограничениями"""
-        await self._rate_limit()
+    async def _make_request(self, method: str, url: str, max_attempts: int = 5, **kwargs) -> Optional[Dict]:
+        """Выполнение запроса с ограничениями.
+        При 429/412 запрос повторяется на месте: пауза по Retry-After или экспоненциальная 1→2→4…60 с.
+        """
+        cache_key = None
+        if self._cache is not None:
+            cache_key = ResponseCache.key(method, url, kwargs.get('params'))
+            body = self._cache.get(cache_key, ignore_ttl=self._cache_mode == 'replay')
+            if body is not None:
+                return json_loads(body)
+            if self._cache_mode == 'replay':
+                logger.warning(f"⚠️ Нет ответа в кэше (replay): {url}")
+                return None
         
-        try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.request(method, url, headers=self.headers, **kwargs)
+        for attempt in range(max_attempts):
+            await self._rate_limit()
+            
+            try:
+                response = await self._client.request(method, url, **kwargs)
                 
                 if response.status_code == 200:
-                    return response.json()
+                    if cache_key is not None and self._cache_mode == 'enabled':
+                        self._cache.set(cache_key, response.content)
+                    return json_loads(response.content)
                 elif response.status_code in (429, 412):  # Rate-limit / anti-bot
-                    logger.warning(f"⚠️ Ограничение API ({response.status_code}). Ожидание 60 секунд...")
-                    await asyncio.sleep(60)
-                    return None
+                    retry_after = self._retry_after(response, attempt)
+                    logger.warning(f"⚠️ Ограничение API ({response.status_code}). "
+                                   f"Повтор {attempt + 1}/{max_attempts} через {retry_after:.1f} с...")
+                    await asyncio.sleep(retry_after + random.uniform(0, 0.5))
+                    continue
                 elif response.status_code == 403:  # Forbidden
                     logger.error("❌ API заблокирован. Проверьте токен и права доступа.")
                     return None
@@ -95,31 +235,71 @@ class RateLimitedMoySkladCollector:
                     logger.error(f"❌ Ошибка API: {response.status_code} - {response.text}")
                     return None
                     
-        except Exception as e:
-            logger.error(f"❌ Ошибка запроса: {e}")
-            return None
+            except Exception as e:
+                logger.error(f"❌ Ошибка запроса: {e}")
+                return None
+        
+        logger.error(f"❌ Лимит API не снят после {max_attempts} попыток: {url}")
+        return None
+    
+    @staticmethod
+    def _retry_after(response: httpx.Response, attempt: int) -> float:
+        """Пауза перед повтором: заголовок Retry-After (MoySklad также шлет X-Lognex-Retry-After в мс)"""
+        backoff = min(60.0, float(2 ** attempt))
+        header = response.headers.get('Retry-After')
+        if header:
+            try:
+                return min(60.0, float(header))
+            except ValueError:
+                return backoff
+        header = response.headers.get('X-Lognex-Retry-After')
+        if header:
+            try:
+                return min(60.0, float(header) / 1000.0)
+            except ValueError:
+                return backoff
+        return backoff
+    
+    async def _bounded_request(self, method: str, url: str, **kwargs) -> Optional[Dict]:
+        """Запрос с ограничением числа одновременных запросов"""
+        async with self._sem:
+            return await self._make_request(method, url, **kwargs)
+    
+    async def _get_all_rows(self, url: str, params: Optional[Dict] = None, page_size: int = 100) -> List[Dict]:
+        """Все строки списочного запроса: первая страница, затем остальные конкурентно по meta.size"""
+        params = dict(params or {})
+        first = await self._make_request("GET", url, params={**params, "limit": page_size, "offset": 0})
+        if not first:
+            return []
+        all_rows: List[Dict] = list(first.get("rows", []))
+        
+        total = (first.get("meta") or {}).get("size")
+        if total is not None:
+            # Размер известен - остальные страницы запрашиваем конкурентно
+            pages = await asyncio.gather(*(
+                self._bounded_request("GET", url, params={**params, "limit": page_size, "offset": offset})
+                for offset in range(page_size, total, page_size)
+            ))
+            for data in pages:
+                if data:
+                    all_rows.extend(data.get("rows", []))
+        else:
+            # Без meta.size идем по страницам последовательно
+            offset = page_size
+            rows = all_rows
+            while len(rows) == page_size:
+                data = await self._make_request("GET", url, params={**params, "limit": page_size, "offset": offset})
+                rows = (data or {}).get("rows", [])
+                all_rows.extend(rows)
+                offset += page_size
+        
+        return all_rows
     
     async def get_all_products(self) -> List[Dict]:
         """Получение ассортимента (с кодами) из MoySklad с ограничениями"""
         logger.info("📦 Получение ассортимента из MoySklad...")
-        all_rows: List[Dict] = []
-        offset = 0
-        page_size = 100
-        while True:
-            data = await self._make_request(
-                "GET",
-                f"{self.api_url}/entity/assortment",
-                params={"limit": page_size, "offset": offset},
-            )
-            if not data:
-                break
-            rows = data.get("rows", [])
-            if not rows:
-                break
-            all_rows.extend(rows)
-            if len(rows) < page_size:
-                break
-            offset += page_size
+        all_rows = await self._get_all_rows(f"{self.api_url}/entity/assortment")
+        
         logger.info(f"✅ Получено {len(all_rows)} позиций ассортимента из MoySklad")
         return all_rows
     
@@ -134,57 +314,166 @@ class RateLimitedMoySkladCollector:
         moment_from = start_date.replace(microsecond=0).strftime('%Y-%m-%dT00:00:00')
         moment_to = end_date.replace(microsecond=0).strftime('%Y-%m-%dT23:59:59')
 
-        # Получаем документы продаж с ограничениями (используем momentFrom/momentTo)
-        data = await self._make_request(
-            "GET",
+        # Получаем документы продаж с ограничениями (используем momentFrom/momentTo).
+        # Позиции приходят сразу в ответе (expand), а документы отбираются по товару на стороне API;
+        # страницы после первой запрашиваются конкурентно (expand работает при limit <= 100)
+        demands = await self._get_all_rows(
             f"{self.api_url}/entity/demand",
             params={
                 "momentFrom": moment_from,
                 "momentTo": moment_to,
-                "limit": 100  # Уменьшаем лимит
-            }
+                "filter": f"assortment={self.api_url}/entity/product/{product_id}",
+                "expand": "positions.assortment",
+            },
+            page_size=100
         )
         
-        if not data:
-            return []
-        
         sales_data = []
         
-        for demand in data.get("rows", []):
-            # Получаем позиции документа с задержкой
-            positions_data = await self._make_request(
-                "GET",
-                f"{self.api_url}/entity/demand/{demand['id']}/positions",
-                params={"expand": "assortment"}
-            )
-            
-            if positions_data:
-                for position in positions_data.get("rows", []):
-                    assortment = position.get("assortment", {})
-                    assortment_id = None
-
-                    if isinstance(assortment, dict):
-                        # Прямой id, если expand сработал
-                        assortment_id = assortment.get("id")
-                        if not assortment_id:
-                            # Пробуем извлечь из meta.href
-                            href = (assortment.get("meta", {}) or {}).get("href", "")
-                            if href:
-                                assortment_id = href.rstrip("/").split("/")[-1]
-
-                    if assortment_id == product_id:
-                        sales_data.append({
-                            "date": demand.get("moment"),
-                            "quantity": position.get("quantity", 0),
-                            "price": (position.get("price", 0) or 0) / 100,
-                            "sum": (position.get("sum", 0) or 0) / 100
-                        })
+        for demand in demands:
+            positions = (demand.get("positions") or {}).get("rows", [])
+            for position in positions:
+                if self._assortment_id(position) == product_id:
+                    sales_data.append(self._sale_record(demand, position))
         
         logger.info(f"✅ Получено {len(sales_data)} записей продаж для товара {product_id}")
         return sales_data
     
+    async def collect_all_sales(self, days_back: int = 90) -> Dict[str, List[Dict]]:
+        """Продажи по всем товарам за период: один проход по отгрузкам вместо запросов на каждый товар.
+        Возвращает product_id -> записи продаж (как в get_sales_data).
+        """
+        logger.info(f"📊 Получение продаж по всем товарам за {days_back} дней...")
+
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=days_back)
+
+        demands = await self._get_all_rows(
+            f"{self.api_url}/entity/demand",
+            params={
+                "momentFrom": start_date.strftime('%Y-%m-%dT00:00:00'),
+                "momentTo": end_date.strftime('%Y-%m-%dT23:59:59'),
+                "expand": "positions.assortment",
+            },
+            page_size=100
+        )
+
+        sales_by_product: Dict[str, List[Dict]] = {}
+        for demand in demands:
+            for position in (demand.get("positions") or {}).get("rows", []):
+                assortment_id = self._assortment_id(position)
+                if assortment_id:
+                    sales_by_product.setdefault(assortment_id, []).append(self._sale_record(demand, position))
+
+        logger.info(f"✅ Получено продаж по {len(sales_by_product)} товарам из {len(demands)} отгрузок")
+        return sales_by_product
+    
+    @staticmethod
+    def _assortment_id(position: Dict) -> Optional[str]:
+        """id товара позиции: из expand, иначе из meta.href"""
+        assortment = position.get("assortment", {})
+        if not isinstance(assortment, dict):
+            return None
+        # Прямой id, если expand сработал
+        assortment_id = assortment.get("id")
+        if not assortment_id:
+            # Пробуем извлечь из meta.href
+            href = (assortment.get("meta", {}) or {}).get("href", "")
+            if href:
+                assortment_id = href.rstrip("/").split("/")[-1]
+        return assortment_id
+    
+    @staticmethod
+    def _sale_record(demand: Dict, position: Dict) -> Dict:
+        return {
+            "date": demand.get("moment"),
+            "quantity": position.get("quantity", 0),
+            "price": (position.get("price", 0) or 0) / 100,
+            "sum": (position.get("sum", 0) or 0) / 100
+        }
+    
+    async def _get_stock_day(self, day: datetime.date, stock_filter: Optional[str] = None,
+                             limit: int = 1000):
+        """Снимок report/stock/all на начало дня; возвращает (day, data)"""
+        params = {
+            "moment": f"{day.isoformat()}T00:00:00",
+            "limit": limit,
+        }
+        if stock_filter:
+            params["filter"] = stock_filter
+        data = await self._bounded_request(
+            "GET",
+            f"{self.api_url}/report/stock/all",
+            params=params,
+        )
+        return day, data
+    
+    @staticmethod
+    def _stock_filter(product_code: str, product_href: Optional[str] = None) -> Optional[str]:
+        """Серверный фильтр отчета об остатках: по ссылке на товар/модификацию, иначе поиск по коду"""
+        if product_href:
+            entity = product_href.rstrip("/").split("/")[-2]
+            if entity in ("product", "variant"):
+                return f"{entity}={product_href}"
+        if product_code:
+            return f"search={product_code}"
+        return None
+    
+    async def _get_stock_day_rows(self, day: datetime.date, page_size: int = 1000):
+        """Полный отчет об остатках на начало дня со всеми страницами; возвращает (day, rows)"""
+        _, first = await self._get_stock_day(day, limit=page_size)
+        if not first:
+            return day, []
+        rows = list(first.get("rows", []))
+        total = (first.get("meta") or {}).get("size") or 0
+        if total > page_size:
+            pages = await asyncio.gather(*(
+                self._bounded_request(
+                    "GET",
+                    f"{self.api_url}/report/stock/all",
+                    params={"moment": f"{day.isoformat()}T00:00:00", "limit": page_size, "offset": offset},
+                )
+                for offset in range(page_size, total, page_size)
+            ))
+            for data in pages:
+                if data:
+                    rows.extend(data.get("rows", []))
+        return day, rows
+    
+    async def get_stock_matrix(self, product_codes: Set[str], start_date: datetime.date,
+                               end_date: datetime.date, chunk_days: int = None) -> Dict[str, pd.DataFrame]:
+        """Остатки сразу по всем товарам: один отчет на день вместо отдельного запроса на каждый товар.
+        Возвращает code -> DataFrame дневных остатков для кодов из product_codes.
+        """
+        logger.info(f"📦 Остатки для {len(product_codes)} товаров: {start_date} .. {end_date}")
+
+        if chunk_days is None:
+            chunk_days = int(os.getenv('MSK_CHUNK_DAYS', '31'))
+        pause_after_chunk = float(os.getenv('MSK_CHUNK_PAUSE_SEC', '5'))
+
+        by_code = {code: StockColumns(code, start_date) for code in product_codes}
+        current = start_date
+        while current <= end_date:
+            chunk_end = min(current + timedelta(days=chunk_days - 1), end_date)
+            days = [current + timedelta(days=k) for k in range((chunk_end - current).days + 1)]
+
+            results = await asyncio.gather(*(self._get_stock_day_rows(day) for day in days))
+
+            for day, rows in results:
+                for row in rows:
+                    series = by_code.get(row.get("code"))
+                    if series is not None:
+                        series.append(day, row)
+
+            logger.info(f"⏸ Пауза {pause_after_chunk:.1f} c после чанка {current}..{chunk_end}")
+            await asyncio.sleep(pause_after_chunk)
+            current = chunk_end + timedelta(days=1)
+
+        logger.info(f"✅ Получено {sum(map(len, by_code.values()))} дневных записей остатков")
+        return {code: series.to_frame() for code, series in by_code.items()}
+    
     async def get_stock_data(self, product_code: str, start_date: datetime.date, end_date: datetime.date,
-                             chunk_days: int = None) -> List[Dict]:
+                             chunk_days: int = None, product_href: Optional[str] = None) -> pd.DataFrame:
         """Получение данных об остатках товара: day-by-day по report/stock/all, с чанками и паузами.
         Чанки нужны для контролируемых пауз, чтобы не ловить антибот при длинных сериях запросов.
         """
@@ -194,38 +483,30 @@ class RateLimitedMoySkladCollector:
             chunk_days = int(os.getenv('MSK_CHUNK_DAYS', '31'))
         pause_after_chunk = float(os.getenv('MSK_CHUNK_PAUSE_SEC', '5'))
 
-        stock_data: List[Dict] = []
+        # Фильтруем на стороне API, чтобы не выкачивать весь отчет ради одной строки;
+        # точное совпадение кода по-прежнему проверяется ниже
+        stock_filter = self._stock_filter(product_code, product_href)
+        limit = 100 if stock_filter else 1000
+
+        stock_data = StockColumns(product_code, start_date)
         current = start_date
         while current <= end_date:
             chunk_end = min(current + timedelta(days=chunk_days - 1), end_date)
-            day = current
-            while day <= chunk_end:
-                params = {
-                    "moment": f"{day.isoformat()}T00:00:00",
-                    "limit": 1000,
-                }
-                data = await self._make_request(
-                    "GET",
-                    f"{self.api_url}/report/stock/all",
-                    params=params,
-                )
-                if data:
-                    for row in data.get("rows", []):
-                        row_code = row.get("code")
-                        if product_code and row_code and row_code != product_code:
-                            continue
-                        if product_code and not row_code:
-                            continue
-                        stock_data.append({
-                            "date": day.isoformat(),
-                            "quantity": row.get("quantity", 0),
-                            "reserve": row.get("reserve", 0),
-                            "inTransit": row.get("inTransit", 0),
-                            "product_code": row_code or product_code,
-                        })
-                # Лёгкая пауза между днями (дополнительно к rate-limit)
-                await asyncio.sleep(0.05)
-                day += timedelta(days=1)
+            days = [current + timedelta(days=k) for k in range((chunk_end - current).days + 1)]
+
+            # Дни чанка запрашиваются конкурентно; паузы между запросами обеспечивает _rate_limit
+            results = await asyncio.gather(*(self._get_stock_day(day, stock_filter, limit) for day in days))
+
+            for day, data in results:
+                if not data:
+                    continue
+                for row in data.get("rows", []):
+                    row_code = row.get("code")
+                    if product_code and row_code and row_code != product_code:
+                        continue
+                    if product_code and not row_code:
+                        continue
+                    stock_data.append(day, row)
 
             # Пауза после чанка
             logger.info(f"⏸ Пауза {pause_after_chunk:.1f} c после чанка {current}..{chunk_end}")
@@ -233,22 +514,80 @@ class RateLimitedMoySkladCollector:
             current = chunk_end + timedelta(days=1)
 
         logger.info(f"✅ Получено {len(stock_data)} дневных записей остатков для кода {product_code}")
-        return stock_data
+        return stock_data.to_frame()
+
+def _lag(values: np.ndarray, periods: int, fill=0.0) -> np.ndarray:
+    """Сдвиг ряда на periods назад; первые значения заполняются fill"""
+    result = np.empty_like(values)
+    head = min(periods, len(values))
+    result[:head] = fill
+    result[head:] = values[:len(values) - head]
+    return result
+
+def _rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Скользящее среднее по окну window (min_periods=1) через накопленные суммы"""
+    csum = np.cumsum(values)
+    result = csum.copy()
+    result[window:] = csum[window:] - csum[:-window]
+    counts = np.minimum(np.arange(1, len(values) + 1), window)
+    return result / counts
+
+class _StreamedDict:
+    """Словарь для потоковой записи в pickle: элементы берутся из итератора по мере записи,
+    при загрузке получается обычный dict"""
+
+    def __init__(self, items):
+        self._items = items
+
+    def __reduce__(self):
+        return dict, (), None, None, self._items
 
 class MLModelTrainer:
     """Класс для обучения ML моделей"""
     
     def __init__(self):
         self.models_dir = "data/real_models"
+        # Идентификатор общей модели, обученной сразу по всем товарам
+        self.shared_model_id = "universal"
+        # Индекс сохраненных моделей: одна JSON-строка на каждый save_models
+        self.manifest_path = os.path.join(self.models_dir, "manifest.jsonl")
+        # Календарные признаки одинаковы для всех товаров: (первая дата, последняя дата) -> массивы
+        self._calendar_cache: Dict[tuple, Dict[str, np.ndarray]] = {}
         os.makedirs(self.models_dir, exist_ok=True)
     
-    def prepare_features(self, sales_data: List[Dict], stock_data: List[Dict]) -> pd.DataFrame:
-        """Подготовка признаков: продажи вычисляются как убывание остатков (stock delta)."""
+    def _calendar(self, start: pd.Timestamp, end: pd.Timestamp) -> Dict[str, np.ndarray]:
+        """Календарные и сезонные признаки для каждого дня диапазона (считаются один раз за запуск)"""
+        key = (start, end)
+        calendar = self._calendar_cache.get(key)
+        if calendar is None:
+            dates = pd.date_range(start, end, freq='D')
+            month = dates.month.to_numpy()
+            day = dates.day.to_numpy()
+            day_of_week = dates.dayofweek.to_numpy()
+            calendar = {
+                'year': dates.year.to_numpy(),
+                'month': month,
+                'day': day,
+                'day_of_year': dates.dayofyear.to_numpy(),
+                'day_of_week': day_of_week,
+                'is_month_start': day == 1,
+                'is_quarter_start': (day == 1) & np.isin(month, [1, 4, 7, 10]),
+                'is_weekend': day_of_week >= 5,
+                'is_holiday_season': np.isin(month, [12, 1, 2]),
+                'is_summer_season': np.isin(month, [6, 7, 8]),
+            }
+            self._calendar_cache[key] = calendar
+        return calendar
+    
+    def prepare_features(self, sales_data: List[Dict], stock_data) -> pd.DataFrame:
+        """Подготовка признаков: продажи вычисляются как убывание остатков (stock delta).
+        stock_data - DataFrame остатков от сборщика или список записей.
+        """
         # Формируем DataFrame остатков
-        if not stock_data:
+        if stock_data is None or len(stock_data) == 0:
             return pd.DataFrame()
 
-        sdf = pd.DataFrame(stock_data)
+        sdf = stock_data if isinstance(stock_data, pd.DataFrame) else pd.DataFrame(stock_data)
         if sdf.empty:
             return pd.DataFrame()
         sdf['date'] = pd.to_datetime(sdf['date'])
@@ -259,131 +598,253 @@ class MLModelTrainer:
             if col not in sdf.columns:
                 sdf[col] = 0
 
+        # Исходные ряды извлекаем один раз и считаем признаки на массивах NumPy
+        sdf[['quantity', 'reserve', 'inTransit']] = sdf[['quantity', 'reserve', 'inTransit']].fillna(0)
+        qty = sdf['quantity'].to_numpy(dtype=np.float64)
+
+        # Календарные признаки берем из общей таблицы по смещению дня от начала диапазона
+        dates = sdf['date'].to_numpy()
+        offsets = (dates - dates[0]) // np.timedelta64(1, 'D')
+        calendar = self._calendar(sdf['date'].iat[0], sdf['date'].iat[-1])
+
         # Вычисляем дневные продажи как убывание остатков (без учета пополнений)
-        sdf['prev_stock'] = sdf['quantity'].shift(1).fillna(sdf['quantity'])
-        raw_delta = sdf['prev_stock'] - sdf['quantity']
-        sdf['daily_sales'] = raw_delta.clip(lower=0)
-
-        # Подготовка итогового DataFrame с признаками
-        sdf['year'] = sdf['date'].dt.year
-        sdf['month'] = sdf['date'].dt.month
-        sdf['day'] = sdf['date'].dt.day
-        sdf['day_of_year'] = sdf['date'].dt.dayofyear
-        sdf['day_of_week'] = sdf['date'].dt.dayofweek
-        sdf['is_month_start'] = sdf['day'] == 1
-        sdf['is_quarter_start'] = (sdf['day'] == 1) & (sdf['month'].isin([1, 4, 7, 10]))
-        sdf['is_weekend'] = sdf['day_of_week'] >= 5
-        sdf['is_holiday_season'] = sdf['month'].isin([12, 1, 2])
-        sdf['is_summer_season'] = sdf['month'].isin([6, 7, 8])
-
-        # Лаги и скользящие средние
-        sdf['stock_lag_1'] = sdf['quantity'].shift(1).fillna(sdf['quantity'])
-        sdf['sales_lag_1'] = sdf['daily_sales'].shift(1).fillna(0)
-        sdf['sales_lag_7'] = sdf['daily_sales'].shift(7).fillna(0)
-        sdf['sales_lag_30'] = sdf['daily_sales'].shift(30).fillna(0)
-        sdf['sales_ma_7'] = sdf['daily_sales'].rolling(7, min_periods=1).mean()
-        sdf['stock_ma_7'] = sdf['quantity'].rolling(7, min_periods=1).mean()
-
-        # Чистим от NaN (после lag/rolling останутся первые значения, но мы их уже заполнили)
-        sdf = sdf.fillna(0)
+        prev_stock = _lag(qty, 1, qty[:1])
+        daily_sales = np.clip(prev_stock - qty, 0, None)
+
+        features = {
+            'prev_stock': prev_stock,
+            'daily_sales': daily_sales,
+            **{name: values[offsets] for name, values in calendar.items()},
+            # Лаги и скользящие средние
+            'stock_lag_1': prev_stock,
+            'sales_lag_1': _lag(daily_sales, 1),
+            'sales_lag_7': _lag(daily_sales, 7),
+            'sales_lag_30': _lag(daily_sales, 30),
+            'sales_ma_7': _rolling_mean(daily_sales, 7),
+            'stock_ma_7': _rolling_mean(qty, 7),
+        }
+        sdf = pd.concat([sdf, pd.DataFrame(features, index=sdf.index)], axis=1)
 
         # Унификация набора колонок
         feature_df = sdf.rename(columns={'quantity': 'stock'})
+
+        # Компактные типы: float32 для вещественных признаков, int8 для флагов
+        dtypes = {col: 'float32' for col in feature_df.select_dtypes(include='float').columns}
+        dtypes.update({col: 'int8' for col in feature_df.select_dtypes(include='bool').columns})
+        feature_df = feature_df.astype(dtypes)
         return feature_df
     
-    def train_models(self, product_id: str, features_df: pd.DataFrame) -> Dict:
-        """Обучение моделей"""
+    def train_models(self, product_id: str, features_df: pd.DataFrame, linear: bool = True) -> Dict:
+        """Обучение моделей. При linear=False обучается только случайный лес"""
         if len(features_df) < 20:  # Уменьшаем минимальное количество данных
             logger.warning(f"⚠️ Недостаточно данных для товара {product_id}: {len(features_df)} записей")
             return {}
         
         # Подготовка данных
         feature_columns = [col for col in features_df.columns if col not in ['daily_sales', 'date']]
-        X = features_df[feature_columns].values
-        y = features_df['daily_sales'].values
+        # Одна C-непрерывная float32-матрица: срезы по строкам ниже - представления без копий,
+        # и sklearn принимает их как есть (dtype уже совпадает с DTYPE деревьев)
+        X = np.ascontiguousarray(features_df[feature_columns].to_numpy(dtype=np.float32))
+        y = features_df['daily_sales'].to_numpy(dtype=np.float32)
         
         # Разделение на обучающую и тестовую выборки
         split_idx = int(len(X) * 0.8)
         X_train, X_test = X[:split_idx], X[split_idx:]
         y_train, y_test = y[:split_idx], y[split_idx:]
         
-        # Нормализация
-        scaler = StandardScaler()
-        X_train_scaled = scaler.fit_transform(X_train)
-        X_test_scaled = scaler.transform(X_test)
+        # Отбор признаков: быстрый неглубокий лес, отбрасываем признаки с нулевой важностью
+        # (коррелированные stock/stock_lag_1/stock_ma_7, year при коротком периоде и т.п.)
+        pre_model = RandomForestRegressor(n_estimators=20, max_depth=6, n_jobs=-1, random_state=42)
+        pre_model.fit(X_train, y_train)
+        mask = pre_model.feature_importances_ > 1e-4
+        del pre_model
+        if mask.any() and not mask.all():
+            dropped = [col for col, keep in zip(feature_columns, mask) if not keep]
+            logger.info(f"✂️ Товар {product_id}: исключены признаки {dropped}")
+            feature_columns = [col for col, keep in zip(feature_columns, mask) if keep]
+            X_train, X_test = X_train[:, mask], X_test[:, mask]
         
         # Обучение моделей
         models = {}
         
-        # Линейная регрессия
-        lr_model = LinearRegression()
-        lr_model.fit(X_train_scaled, y_train)
-        lr_score = lr_model.score(X_test_scaled, y_test)
-        models['linear_regression'] = {
-            'model': lr_model,
-            'scaler': scaler,
-            'accuracy': lr_score,
-            'feature_columns': feature_columns
-        }
+        if linear:
+            # Нормализация
+            scaler = StandardScaler()
+            X_train_scaled = scaler.fit_transform(X_train)
+            X_test_scaled = scaler.transform(X_test)
+            
+            # Линейная регрессия
+            lr_model = LinearRegression()
+            lr_model.fit(X_train_scaled, y_train)
+            lr_score = lr_model.score(X_test_scaled, y_test)
+            models['linear_regression'] = {
+                'model': lr_model,
+                'scaler': scaler,
+                'accuracy': lr_score,
+                'feature_columns': feature_columns
+            }
+            # Масштабированные копии нужны только линейной модели
+            del X_train_scaled, X_test_scaled
         
-        # Случайный лес
-        rf_model = RandomForestRegressor(n_estimators=50, random_state=42)  # Уменьшаем количество деревьев
-        rf_model.fit(X_train_scaled, y_train)
-        rf_score = rf_model.score(X_test_scaled, y_test)
+        # Случайный лес: деревья инвариантны к масштабу, обучаем на исходной матрице
+        # Деревья строятся параллельно на всех ядрах, каждое - на 70% выборки и sqrt признаков
+        rf_model = RandomForestRegressor(
+            n_estimators=50,  # Уменьшаем количество деревьев
+            n_jobs=-1,
+            max_features='sqrt',
+            max_samples=0.7,
+            min_samples_leaf=5,
+            random_state=42
+        )
+        rf_model.fit(X_train, y_train)
+        rf_score = rf_model.score(X_test, y_test)
         models['random_forest'] = {
             'model': rf_model,
-            'scaler': scaler,
+            'scaler': None,
             'accuracy': rf_score,
             'feature_columns': feature_columns
         }
         
         logger.info(f"✅ Модели для товара {product_id} обучены:")
-        logger.info(f"  Linear Regression: {lr_score:.4f}")
+        if linear:
+            logger.info(f"  Linear Regression: {lr_score:.4f}")
         logger.info(f"  Random Forest: {rf_score:.4f}")
         
         return models
 
+    def train_shared_models(self, frames: Dict[str, pd.DataFrame]) -> Dict:
+        """Обучение одной общей модели по всем товарам.
+        Строковый product_code заменяется целочисленным признаком pid - индексом кода
+        в sorted(frames); этот же список сохраняется вместе с моделью (save_models).
+        pid - метка, а не величина, поэтому линейная модель не обучается, только лес.
+        """
+        if not frames:
+            return {}
+        
+        big = pd.concat(
+            [frames[code].drop(columns='product_code').assign(pid=np.int32(i))
+             for i, code in enumerate(sorted(frames))],
+            ignore_index=True
+        )
+        # Сортировка по дате: в тестовую выборку попадают последние 20% периода по всем товарам
+        big.sort_values('date', kind='stable', inplace=True, ignore_index=True)
+        logger.info(f"📊 Общая выборка: {len(big)} строк по {len(frames)} товарам")
+        
+        return self.train_models(self.shared_model_id, big, linear=False)
+
     def build_universal_models_file(self) -> int:
-        """Собирает единый файл /app/data/universal_forecast_models.pkl из сохраненных real_models."""
+        """Собирает единый файл /app/data/universal_forecast_models.pkl из сохраненных real_models.
+        Модели пишутся в файл потоково, по одной, без сборки общего словаря в памяти.
+        """
         models_root = self.models_dir
-        universal = {'models': {}, 'results': {}, 'features': [], 'training_date': datetime.now().isoformat(), 'model_type': 'real_data'}
-        try:
+        out_path = '/app/data/universal_forecast_models.pkl'
+        tmp_path = out_path + '.tmp'
+
+        def iter_metadata():
+            # Читаем manifest.jsonl последовательно; при повторном обучении побеждает последняя запись
+            if os.path.exists(self.manifest_path):
+                entries = {}
+                with open(self.manifest_path, 'rb') as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        meta = json_loads(line)
+                        entries[meta.get('product_id')] = meta
+                yield from entries.values()
+                return
+            # Старые каталоги без манифеста - сканируем *_metadata.json
             for name in os.listdir(models_root):
                 if not name.endswith('_metadata.json'):
                     continue
-                meta_path = os.path.join(models_root, name)
-                with open(meta_path, 'r') as f:
-                    meta = json.load(f)
+                with open(os.path.join(models_root, name), 'rb') as f:
+                    yield json_loads(f.read())
+
+        def iter_models(metas, results, features):
+            for meta in metas:
                 pid = meta.get('product_id')
-                results = meta.get('results', {})
+                meta_results = meta.get('results', {})
                 models = meta.get('models', {})
-                if not pid or not results or not models:
+                if not pid or not meta_results or not models:
                     continue
                 # выбираем модель с лучшей accuracy
-                best = max(results.keys(), key=lambda k: results[k].get('accuracy', 0))
+                best = max(meta_results.keys(), key=lambda k: meta_results[k].get('accuracy', 0))
                 model_path = models.get(best)
                 if not model_path or not os.path.exists(model_path):
                     continue
-                with open(model_path, 'rb') as f:
-                    model_obj = pickle.load(f)
-                # пытаемся загрузить scaler рядом
-                scaler_path = model_path.replace('.pkl', '_scaler.pkl')
-                scaler_obj = None
-                if os.path.exists(scaler_path):
-                    with open(scaler_path, 'rb') as f:
-                        scaler_obj = pickle.load(f)
-                universal['models'][pid] = model_obj
-                universal['results'][pid] = {'metadata': {'chosen_model': best, **results[best]}, 'scaler': scaler_obj}
-            out_path = '/app/data/universal_forecast_models.pkl'
-            with open(out_path, 'wb') as f:
-                pickle.dump(universal, f)
-            return len(universal['models'])
+                # Порядок колонок модели есть в metadata каждого товара ('feature_columns');
+                # общий список 'features' - объединение в порядке первого появления
+                for col in meta_results[best].get('feature_columns', []):
+                    if col not in features:
+                        features.append(col)
+                if model_path.endswith('.joblib'):
+                    # модели и скейлеры товара лежат в одном joblib-файле
+                    bundle = joblib.load(model_path)
+                    model_obj, scaler_obj = bundle['models'][best], bundle['scalers'].get(best)
+                else:
+                    # Старая раскладка: файл на каждую модель, скейлер рядом в <модель>_scaler.pkl
+                    with open(model_path, 'rb') as f:
+                        model_obj = pickle.load(f)
+                    scaler_path = model_path.replace('.pkl', '_scaler.pkl')
+                    scaler_obj = None
+                    if os.path.exists(scaler_path):
+                        with open(scaler_path, 'rb') as f:
+                            scaler_obj = pickle.load(f)
+                product_codes = meta.get('product_codes')
+                if product_codes:
+                    # Общая модель: одна и та же модель под каждым кодом, pid - значение признака товара
+                    for idx, code in enumerate(product_codes):
+                        results[code] = {'metadata': {'chosen_model': best, 'pid': idx, **meta_results[best]},
+                                         'scaler': scaler_obj}
+                        yield code, model_obj
+                    continue
+                results[pid] = {'metadata': {'chosen_model': best, **meta_results[best]},
+                                'scaler': scaler_obj}
+                yield pid, model_obj
+
+        def write(metas, fast: bool) -> int:
+            results = {}
+            features = []
+            with open(tmp_path, 'wb') as f:
+                pickler = pickle.Pickler(f, protocol=pickle.HIGHEST_PROTOCOL)
+                # Без memo записанная модель сразу освобождается, в памяти не больше пары моделей
+                pickler.fast = fast
+                # 'results' и 'features' заполняются по ходу записи 'models' и пишутся следом за ним
+                pickler.dump({
+                    'models': _StreamedDict(iter_models(metas, results, features)),
+                    'results': results,
+                    'features': features,
+                    'training_date': datetime.now().isoformat(),
+                    'model_type': 'real_data'
+                })
+            return len(results)
+
+        try:
+            metas = list(iter_metadata())
+            # Товары общей модели: их отдельные модели из прежних запусков не берем,
+            # иначе они перезапишут results[code] общей модели (или наоборот)
+            covered = {code for meta in metas for code in meta.get('product_codes') or ()}
+            if covered:
+                metas = [meta for meta in metas
+                         if meta.get('product_codes') or meta.get('product_id') not in covered]
+            # Общую модель пишем с memo, чтобы она попала в файл один раз, а не под каждым кодом
+            shared = any(meta.get('product_codes') for meta in metas)
+            try:
+                built = write(metas, fast=not shared)
+            except ValueError:
+                # В объектах модели есть циклические ссылки - пишем с memo
+                logger.info("Повторная сборка универсального файла моделей с memo")
+                built = write(metas, fast=False)
+            os.replace(tmp_path, out_path)
+            return built
         except Exception as e:
             logger.error(f"Ошибка сборки универсального файла моделей: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
             return 0
     
-    def save_models(self, product_id: str, models: Dict):
-        """Сохранение моделей"""
+    def save_models(self, product_id: str, models: Dict, product_codes: Optional[List[str]] = None):
+        """Сохранение моделей. Для общей модели product_codes задает соответствие pid -> код товара"""
         model_data = {
             'product_id': product_id,
             'models': {},
@@ -393,27 +854,39 @@ class MLModelTrainer:
             'model_type': 'real_data'
         }
         
+        # Модели и скейлеры товара сохраняются одним сжатым joblib-файлом
+        bundle_path = os.path.join(self.models_dir, f"{product_id}.joblib")
+        bundle = {
+            'models': {name: info['model'] for name, info in models.items()},
+            'scalers': {name: info['scaler'] for name, info in models.items() if info['scaler'] is not None},
+            'feature_columns': {name: info['feature_columns'] for name, info in models.items()},
+        }
+        if product_codes:
+            bundle['product_codes'] = product_codes
+            model_data['product_codes'] = product_codes
+        joblib.dump(bundle, bundle_path, compress=JOBLIB_COMPRESS)
+        
         for model_name, model_info in models.items():
-            # Сохраняем модель
-            model_path = os.path.join(self.models_dir, f"{product_id}_{model_name}.pkl")
-            with open(model_path, 'wb') as f:
-                pickle.dump(model_info['model'], f)
-            
-            # Сохраняем scaler
-            scaler_path = os.path.join(self.models_dir, f"{product_id}_{model_name}_scaler.pkl")
-            with open(scaler_path, 'wb') as f:
-                pickle.dump(model_info['scaler'], f)
-            
-            model_data['models'][model_name] = model_path
+            model_data['models'][model_name] = bundle_path
             model_data['results'][model_name] = {
                 'accuracy': model_info['accuracy'],
-                'feature_columns': model_info['feature_columns']
+                'feature_columns': model_info['feature_columns'],
+                # Признаки, оставшиеся после отбора по важности
+                'kept_features': model_info['feature_columns']
             }
+            # Порядок колонок, в котором модель ждет признаки на входе
+            for col in model_info['feature_columns']:
+                if col not in model_data['features']:
+                    model_data['features'].append(col)
         
         # Сохраняем метаданные
         metadata_path = os.path.join(self.models_dir, f"{product_id}_metadata.json")
-        with open(metadata_path, 'w') as f:
-            json.dump(model_data, f, indent=2)
+        with open(metadata_path, 'wb') as f:
+            f.write(json_dumps(model_data, indent=True))
+        
+        # Дописываем запись в манифест для быстрой сборки универсального файла
+        with open(self.manifest_path, 'ab') as f:
+            f.write(json_dumps(model_data) + b'\n')
         
         logger.info(f"💾 Модели для товара {product_id} сохранены в {self.models_dir}")
 
@@ -422,30 +895,37 @@ async def main():
     logger.info("🚀 Начинаем обучение моделей с учетом ограничений API MoySklad")
     
     # Инициализация
-    data_collector = RateLimitedMoySkladCollector()
     model_trainer = MLModelTrainer()
     
-    # Получение всего ассортимента
-    products = await data_collector.get_all_products()
+    # HTTP-клиент сборщика закрывается после сбора данных
+    async with RateLimitedMoySkladCollector() as data_collector:
+        # Получение всего ассортимента
+        products = await data_collector.get_all_products()
     
-    if not products:
-        logger.error("❌ Не удалось получить товары из MoySklad")
-        logger.info("💡 Возможные причины:")
-        logger.info("   - API заблокирован из-за превышения лимитов")
-        logger.info("   - Неправильный токен API")
-        logger.info("   - Нет прав доступа")
-        return
+        if not products:
+            logger.error("❌ Не удалось получить товары из MoySklad")
+            logger.info("💡 Возможные причины:")
+            logger.info("   - API заблокирован из-за превышения лимитов")
+            logger.info("   - Неправильный токен API")
+            logger.info("   - Нет прав доступа")
+            return
     
-    # Фильтруем только позиции с непустым code
-    products_with_code = [p for p in products if (p.get('code') or '').strip()]
-    logger.info(f"📦 Товаров с кодом для обучения: {len(products_with_code)} из {len(products)}")
-
-    # Диапазон по умолчанию ~5 лет, можно переопределить MSK_HISTORY_DAYS
-    end_date = datetime.now().date()
-    history_days = int(os.getenv('MSK_HISTORY_DAYS', '1825'))
-    start_date = end_date - timedelta(days=history_days)
+        # Фильтруем только позиции с непустым code
+        products_with_code = [p for p in products if (p.get('code') or '').strip()]
+        logger.info(f"📦 Товаров с кодом для обучения: {len(products_with_code)} из {len(products)}")
+
+        # Диапазон по умолчанию ~5 лет, можно переопределить MSK_HISTORY_DAYS
+        end_date = datetime.now().date()
+        history_days = int(os.getenv('MSK_HISTORY_DAYS', '1825'))
+        start_date = end_date - timedelta(days=history_days)
+
+        # Остатки по всем товарам собираем за один проход по дням
+        stock_matrix = await data_collector.get_stock_matrix(
+            {(p.get('code') or '').strip() for p in products_with_code}, start_date, end_date
+        )
 
-    successful_models = 0
+    # Признаки по всем товарам собираются в одну выборку для общей модели
+    frames = {}
 
     for i, product in enumerate(products_with_code, 1):
         product_code = (product.get('code') or '').strip()
@@ -454,8 +934,7 @@ async def main():
         logger.info(f"📦 [{i}/{len(products_with_code)}] Обрабатываем товар: {product_name} (code={product_code})")
 
         try:
-            # Сбор остатков за весь период чанками
-            stock_data = await data_collector.get_stock_data(product_code, start_date, end_date)
+            stock_data = stock_matrix.get(product_code)
 
             # Подготовка признаков (продажи = убывание остатков)
             features_df = model_trainer.prepare_features([], stock_data)
@@ -464,26 +943,29 @@ async def main():
                 logger.warning(f"⚠️ Недостаточно данных для товара {product_name} ({product_code})")
                 continue
 
-            # Обучение моделей
-            models = model_trainer.train_models(product_code, features_df)
-
-            if models:
-                # Сохранение моделей
-                model_trainer.save_models(product_code, models)
-                logger.info(f"✅ Модели для {product_name} ({product_code}) обучены и сохранены")
-                successful_models += 1
-            else:
-                logger.warning(f"⚠️ Не удалось обучить модели для {product_name} ({product_code})")
+            frames[product_code] = features_df
 
         except Exception as e:
             logger.error(f"❌ Ошибка обработки {product_name} ({product_code}): {e}")
             continue
 
-        # Пауза между товарами (снижаем вероятность антибота)
-        if i < len(products_with_code):
-            await asyncio.sleep(2)
+    successful_models = 0
+
+    try:
+        # Одна общая модель вместо отдельной модели на каждый товар
+        models = model_trainer.train_shared_models(frames)
+
+        if models:
+            model_trainer.save_models(model_trainer.shared_model_id, models, product_codes=sorted(frames))
+            logger.info(f"✅ Общая модель обучена и сохранена для {len(frames)} товаров")
+            successful_models = len(frames)
+        else:
+            logger.warning("⚠️ Не удалось обучить общую модель")
+
+    except Exception as e:
+        logger.error(f"❌ Ошибка обучения общей модели: {e}")
 
-    logger.info(f"🎉 Обучение завершено! Успешно обучено моделей: {successful_models}/{len(products_with_code)}")
+    logger.info(f"🎉 Обучение завершено! Товаров в общей модели: {successful_models}/{len(products_with_code)}")
     
     if successful_models > 0:
         # Сборка универсального файла моделей
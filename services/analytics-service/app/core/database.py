@@ -4,7 +4,7 @@
 
 import asyncpg
 import logging
-from typing import Optional
+from typing import List, Optional, Tuple
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
@@ -91,6 +91,13 @@ async def init_database():
                 ON sales_analytics(product_id, date)
             """)
             
+            # BRIN по дате для сканов по диапазонам дат: таблица пополняется по времени,
+            # индекс на порядки меньше btree
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_sales_analytics_date_brin 
+                ON sales_analytics USING BRIN (date) WITH (pages_per_range = 32)
+            """)
+            
             await conn.execute("""
                 CREATE INDEX IF NOT EXISTS idx_performance_metrics_name_date 
                 ON performance_metrics(metric_name, metric_date)
@@ -100,4 +107,28 @@ async def init_database():
         
     except Exception as e:
         logger.error(f"❌ Ошибка инициализации базы данных: {e}")
-        raise 
\ No newline at end of file
+        raise
+
+
+async def bulk_insert_sales(rows: List[Tuple]) -> int:
+    """Пакетная вставка строк в sales_analytics через бинарный COPY.
+    
+    rows - кортежи (product_id, date, quantity, revenue).
+    """
+    if not rows:
+        return 0
+    
+    try:
+        pool = await get_database()
+        async with pool.acquire() as conn:
+            await conn.copy_records_to_table(
+                'sales_analytics',
+                records=rows,
+                columns=['product_id', 'date', 'quantity', 'revenue']
+            )
+        logger.info(f"✅ В sales_analytics записано строк: {len(rows)}")
+        return len(rows)
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка пакетной вставки продаж: {e}")
+        raise
@@ -3,8 +3,9 @@
 """
 
 import redis.asyncio as redis
+import msgpack
 import logging
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
@@ -22,7 +23,8 @@ async def get_redis_client() -> redis.Redis:
             _redis_client = redis.from_url(
                 settings.redis_url,
                 db=settings.redis_db,
-                decode_responses=True
+                # Байтовые ответы: объекты хранятся в msgpack, строки декодирует get_cache
+                decode_responses=False
             )
             # Проверка подключения
             await _redis_client.ping()
@@ -61,6 +63,7 @@ async def get_cache(key: str) -> Optional[str]:
         value = await client.get(key)
         if value:
             logger.debug(f"✅ Кэш получен: {key}")
+            return value.decode('utf-8')
         return value
     except Exception as e:
         logger.error(f"❌ Ошибка получения кэша: {e}")
@@ -74,4 +77,56 @@ async def delete_cache(key: str):
         await client.delete(key)
         logger.debug(f"✅ Кэш удален: {key}")
     except Exception as e:
-        logger.error(f"❌ Ошибка удаления кэша: {e}") 
\ No newline at end of file
+        logger.error(f"❌ Ошибка удаления кэша: {e}")
+
+
+async def set_cache_obj(key: str, obj: Any, ttl: int = 300):
+    """Установка объекта в кэш (msgpack вместо JSON-строки)"""
+    try:
+        client = await get_redis_client()
+        await client.set(key, msgpack.packb(obj, use_bin_type=True), ex=ttl)
+        logger.debug(f"✅ Кэш установлен: {key}")
+    except Exception as e:
+        logger.error(f"❌ Ошибка установки кэша: {e}")
+
+
+async def get_cache_obj(key: str) -> Optional[Any]:
+    """Получение объекта из кэша"""
+    try:
+        client = await get_redis_client()
+        raw = await client.get(key)
+        if raw is None:
+            return None
+        logger.debug(f"✅ Кэш получен: {key}")
+        return msgpack.unpackb(raw, raw=False)
+    except Exception as e:
+        logger.error(f"❌ Ошибка получения кэша: {e}")
+        return None
+
+
+async def get_cache_many(keys: List[str]) -> List[Optional[str]]:
+    """Получение нескольких значений из кэша одним MGET"""
+    if not keys:
+        return []
+    try:
+        client = await get_redis_client()
+        values = await client.mget(keys)
+        return [value.decode('utf-8') if value is not None else None for value in values]
+    except Exception as e:
+        logger.error(f"❌ Ошибка получения кэша: {e}")
+        return [None] * len(keys)
+
+
+async def set_cache_many(mapping: Dict[str, str], ttl: int = 300):
+    """Установка нескольких значений в кэш за один проход (pipeline без транзакции)"""
+    if not mapping:
+        return
+    try:
+        client = await get_redis_client()
+        pipe = client.pipeline(transaction=False)
+        for key, value in mapping.items():
+            pipe.set(key, value, ex=ttl)
+        await pipe.execute()
+        logger.debug(f"✅ Кэш установлен: {len(mapping)} ключей")
+    except Exception as e:
+        logger.error(f"❌ Ошибка установки кэша: {e}")
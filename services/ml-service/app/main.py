@@ -136,52 +136,80 @@ async def health_check():
     }
 
 
+async def build_forecast(request: ForecastRequest) -> ForecastResponse:
+    """Построение прогноза спроса для одного продукта"""
+    # Получение исторических данных
+    historical_data = await data_processor.get_historical_data(
+        request.product_id, 
+        days_back=90
+    )
+    
+    if not historical_data:
+        raise HTTPException(
+            status_code=404, 
+            detail=f"Исторические данные для продукта {request.product_id} не найдены"
+        )
+    
+    # Создание признаков
+    features = await feature_engineer.create_features(historical_data)
+    
+    # Получение прогноза
+    forecast = await ml_service.get_forecast(
+        product_id=request.product_id,
+        features=features,
+        forecast_days=request.forecast_days,
+        model_type=request.model_type
+    )
+    
+    return ForecastResponse(
+        product_id=request.product_id,
+        daily_demand=forecast["daily_demand"],
+        weekly_demand=forecast["weekly_demand"],
+        monthly_demand=forecast["monthly_demand"],
+        accuracy=forecast["accuracy"],
+        confidence_interval=forecast["confidence_interval"],
+        seasonality_factor=forecast.get("seasonality_factor"),
+        trend_factor=forecast.get("trend_factor"),
+        model_type=forecast["model_type"],
+        features_used=forecast["features_used"],
+        last_updated=datetime.now()
+    )
+
+
 @app.post("/forecast", response_model=ForecastResponse)
 async def get_forecast(request: ForecastRequest):
     """Получение прогноза спроса для продукта"""
     try:
-        # Получение исторических данных
-        historical_data = await data_processor.get_historical_data(
-            request.product_id, 
-            days_back=90
-        )
-        
-        if not historical_data:
-            raise HTTPException(
-                status_code=404, 
-                detail=f"Исторические данные для продукта {request.product_id} не найдены"
-            )
-        
-        # Создание признаков
-        features = await feature_engineer.create_features(historical_data)
-        
-        # Получение прогноза
-        forecast = await ml_service.get_forecast(
-            product_id=request.product_id,
-            features=features,
-            forecast_days=request.forecast_days,
-            model_type=request.model_type
-        )
-        
-        return ForecastResponse(
-            product_id=request.product_id,
-            daily_demand=forecast["daily_demand"],
-            weekly_demand=forecast["weekly_demand"],
-            monthly_demand=forecast["monthly_demand"],
-            accuracy=forecast["accuracy"],
-            confidence_interval=forecast["confidence_interval"],
-            seasonality_factor=forecast.get("seasonality_factor"),
-            trend_factor=forecast.get("trend_factor"),
-            model_type=forecast["model_type"],
-            features_used=forecast["features_used"],
-            last_updated=datetime.now()
-        )
+        return await build_forecast(request)
         
     except Exception as e:
         logger.error(f"Ошибка получения прогноза для {request.product_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/forecast/batch", response_model=List[Optional[ForecastResponse]])
+async def get_forecast_batch(requests: List[ForecastRequest]):
+    """Получение прогнозов для нескольких продуктов одним запросом
+    
+    Ответ идет в порядке запросов; для продуктов, по которым прогноз
+    получить не удалось, возвращается null.
+    """
+    results = await asyncio.gather(
+        *(build_forecast(request) for request in requests),
+        return_exceptions=True
+    )
+    
+    forecasts = []
+    for request, result in zip(requests, results):
+        if isinstance(result, Exception):
+            logger.error(f"Ошибка получения прогноза для {request.product_id}: {result}")
+            forecasts.append(None)
+        else:
+            forecasts.append(result)
+    
+    return forecasts
+
+
 @app.post("/train", response_model=ModelTrainingResponse)
 async def train_model(request: ModelTrainingRequest, background_tasks: BackgroundTasks):
     """Обучение модели для продукта"""
@@ -438,7 +438,7 @@ class MLModelService:
             filepath = os.path.join(self.models_dir, filename)
             
             with open(filepath, 'wb') as f:
-                pickle.dump(model_data, f)
+                pickle.dump(model_data, f, protocol=pickle.HIGHEST_PROTOCOL)
             
             logger.info(f"Модель сохранена: {filepath}")
             
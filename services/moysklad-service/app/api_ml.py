@@ -48,18 +48,33 @@ def load_real_models():
                 
                 # Загружаем модели для этого товара
                 product_models = {}
+                bundles = {}
                 for model_name, model_path in metadata.get('models', {}).items():
                     if os.path.exists(model_path):
-                        with open(model_path, 'rb') as f:
-                            model = pickle.load(f)
+                        if model_path.endswith('.joblib'):
+                            # Все модели товара в одном joblib-файле (rate_limited_training.py)
+                            if model_path not in bundles:
+                                bundles[model_path] = joblib.load(model_path)
+                            model = bundles[model_path]['models'][model_name]
+                        else:
+                            with open(model_path, 'rb') as f:
+                                model = pickle.load(f)
                         product_models[model_name] = model
                 
                 if product_models:
-                    real_models[product_id] = {
+                    entry = {
                         'models': product_models,
                         'metadata': metadata
                     }
-                    logger.info(f"Загружены реальные модели для товара {product_id}")
+                    product_codes = metadata.get('product_codes')
+                    if product_codes:
+                        # Общая модель: регистрируем под каждым кодом, pid - индекс кода в сохраненном списке
+                        for pid, code in enumerate(product_codes):
+                            real_models[code] = {**entry, 'pid': pid}
+                        logger.info(f"Загружена общая модель {product_id} для {len(product_codes)} товаров")
+                    else:
+                        real_models[product_id] = entry
+                        logger.info(f"Загружены реальные модели для товара {product_id}")
         
         logger.info(f"Загружено {len(real_models)} товаров с реальными моделями")
         return real_models
@@ -178,9 +193,41 @@ def load_ml_models():
         import traceback
         logger.error(f"Полная ошибка: {traceback.format_exc()}")
 
+# Признаки обучения (rate_limited_training.py), для которых нужна история остатков
+HISTORY_FEATURES = {'prev_stock', 'stock_lag_1', 'sales_lag_1', 'sales_lag_7', 'sales_lag_30',
+                    'sales_ma_7', 'stock_ma_7', 'reserve', 'inTransit'}
+
+def _stock_history_features(stock_history: pd.DataFrame) -> Dict:
+    """Признаки остатков на последний день истории - как в prepare_features при обучении:
+    продажи = убывание остатков, лаги и скользящие средние по дневному ряду"""
+    qty = stock_history['stock'].to_numpy(dtype=np.float64)
+    prev_stock = np.concatenate([qty[:1], qty[:-1]])
+    daily_sales = np.clip(prev_stock - qty, 0, None)
+    
+    def lag(values, periods):
+        return float(values[-1 - periods]) if len(values) > periods else 0.0
+    
+    return {
+        'stock': qty[-1],
+        'reserve': float(stock_history['reserve'].iat[-1]) if 'reserve' in stock_history else 0.0,
+        'inTransit': float(stock_history['inTransit'].iat[-1]) if 'inTransit' in stock_history else 0.0,
+        'prev_stock': prev_stock[-1],
+        'stock_lag_1': prev_stock[-1],
+        'sales_lag_1': lag(daily_sales, 1),
+        'sales_lag_7': lag(daily_sales, 7),
+        'sales_lag_30': lag(daily_sales, 30),
+        'sales_ma_7': daily_sales[-7:].mean(),
+        'stock_ma_7': qty[-7:].mean(),
+    }
+
 def create_ml_features(product_code: str, current_date: datetime, 
-                      current_stock: float = None) -> pd.DataFrame:
-    """Создает признаки для ML прогнозирования"""
+                      current_stock: float = None,
+                      stock_history: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """Создает признаки для ML прогнозирования
+    
+    stock_history - дневные остатки (date, stock[, reserve, inTransit]) по текущий день;
+    по ней считаются те же признаки остатков, что и при обучении.
+    """
     
     # Базовые временные признаки
     features = {
@@ -199,8 +246,16 @@ def create_ml_features(product_code: str, current_date: datetime,
     features['product_category'] = features['product_code_numeric'] % 1000
     features['product_group'] = features['product_code_numeric'] // 1000
     
+    # Для общей модели товар задается признаком pid из метаданных
+    pid = model_metadata.get(product_code, {}).get('pid')
+    if pid is not None:
+        features['pid'] = pid
+    
     # Признаки остатков
     features['current_stock'] = current_stock or 0
+    features['stock'] = current_stock or 0
+    if stock_history is not None and not stock_history.empty:
+        features.update(_stock_history_features(stock_history))
     features['stock_level'] = 'low' if (current_stock or 0) < 50 else 'medium' if (current_stock or 0) < 200 else 'high'
     
     # Сезонные признаки
@@ -248,6 +303,8 @@ async def get_real_stock_data(product_code: str, days_back: int = 30) -> pd.Data
                                 'date': current_date.strftime('%Y-%m-%d'),
                                 'product_code': product_code,
                                 'stock': item.get('quantity', 0),
+                                'reserve': item.get('reserve', 0),
+                                'inTransit': item.get('inTransit', 0),
                                 'product_name': item.get('name', '')
                             })
                             break
@@ -329,15 +386,29 @@ def predict_with_ml_model(product_code: str, features: pd.DataFrame) -> Dict:
     
     try:
         model = ml_models[product_code]
-        scaler = model_scalers[product_code]
+        scaler = model_scalers.get(product_code)
         metadata = model_metadata[product_code]
         
-        # Подготавливаем признаки
-        feature_columns = [col for col in features.columns if col not in ['date', 'product_code']]
-        X = features[feature_columns].values
+        # Подготавливаем признаки в том порядке, в котором модель обучалась
+        feature_columns = metadata.get('feature_columns')
+        if feature_columns:
+            missing = [col for col in feature_columns if col not in features.columns]
+            if missing:
+                # Нулями вместо признаков модель не кормим - это был бы прогноз по пустому входу
+                logger.warning(f"Для {product_code} не хватает признаков модели: {missing}")
+                return {
+                    'consumption': 5.0,
+                    'confidence': 0.5,
+                    'model_type': 'fallback',
+                    'metadata': {'reason': f"Не хватает признаков модели: {', '.join(missing)}"}
+                }
+            X = features[feature_columns].to_numpy(dtype=np.float32)
+        else:
+            feature_columns = [col for col in features.columns if col not in ['date', 'product_code']]
+            X = features[feature_columns].values
         
-        # Масштабируем признаки
-        X_scaled = scaler.transform(X)
+        # Масштабируем признаки (у деревьев скейлера нет - они не чувствительны к масштабу)
+        X_scaled = scaler.transform(X) if scaler is not None else X
         
         # Делаем прогноз
         prediction = model.predict(X_scaled)[0]
@@ -410,8 +481,15 @@ async def forecast_demand(request: ForecastRequest):
         # Получаем текущие остатки
         current_stock = await get_current_stock(request.product_code)
         
+        # Модели, обученные на истории остатков, получают те же лаги и средние, что при обучении:
+        # для лага продаж в 30 дней нужны остатки за 32 дня (days_back=31 включает текущий день)
+        stock_history = None
+        trained_columns = model_metadata.get(request.product_code, {}).get('feature_columns') or []
+        if HISTORY_FEATURES.intersection(trained_columns):
+            stock_history = await get_real_stock_data(request.product_code, days_back=31)
+        
         # Создаем признаки для ML модели
-        features = create_ml_features(request.product_code, datetime.now(), current_stock)
+        features = create_ml_features(request.product_code, datetime.now(), current_stock, stock_history)
         
         # Делаем ML прогноз
         ml_prediction = predict_with_ml_model(request.product_code, features)
@@ -46,7 +46,7 @@ async def export_demands(start_date, end_date, filename):
         writer = None
         fieldnames = set()
         total_rows = 0
-        start_time = time.time()
+        start_time = time.monotonic()
         
         async with httpx.AsyncClient(timeout=30.0) as client:
             # Получаем документы продаж
@@ -134,7 +134,7 @@ async def export_demands(start_date, end_date, filename):
             except Exception as e:
                 print(f"Ошибка при получении документов продаж: {e}")
         
-        print(f"Документы продаж экспортированы в {filename}: {total_rows} записей за {time.time() - start_time:.1f} секунд")
+        print(f"Документы продаж экспортированы в {filename}: {total_rows} записей за {time.monotonic() - start_time:.1f} секунд")
 
 async def main():
     """Основная функция"""
@@ -33,7 +33,7 @@ async def export_stock_history(start_date, end_date, filename):
         writer = None
         fieldnames = set()
         total_rows = 0
-        start_time = time.time()
+        start_time = time.monotonic()
         
         async with httpx.AsyncClient(timeout=30.0) as client:
             # Итерируем по дням
@@ -108,7 +108,7 @@ async def export_stock_history(start_date, end_date, filename):
                 
                 current_date += timedelta(days=1)
         
-        print(f"Остатки экспортированы в {filename}: {total_rows} записей за {time.time() - start_time:.1f} секунд")
+        print(f"Остатки экспортированы в {filename}: {total_rows} записей за {time.monotonic() - start_time:.1f} секунд")
 
 async def main():
     """Основная функция"""
@@ -9,15 +9,16 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
-import json
 import logging
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.linear_model import LinearRegression
 from sklearn.preprocessing import StandardScaler
-import pickle
 import os
 from dotenv import load_dotenv
 
+from ml_model_inspect import json_dumps, json_loads
+from ml_training_utils import lags_and_mas, save_model_bundle
+
 # Загружаем переменные окружения
 load_dotenv()
 
@@ -51,7 +52,7 @@ class MoySkladDataCollector:
                 )
                 
                 if response.status_code == 200:
-                    data = response.json()
+                    data = json_loads(response.content)
                     products = data.get("rows", [])
                     logger.info(f"Получено {len(products)} товаров из MoySklad")
                     return products
@@ -85,7 +86,7 @@ class MoySkladDataCollector:
                     logger.error(f"Ошибка получения продаж: {response.status_code}")
                     return []
                 
-                data = response.json()
+                data = json_loads(response.content)
                 sales_data = []
                 
                 for demand in data.get("rows", []):
@@ -97,7 +98,7 @@ class MoySkladDataCollector:
                     )
                     
                     if positions_response.status_code == 200:
-                        positions_data = positions_response.json()
+                        positions_data = json_loads(positions_response.content)
                         
                         for position in positions_data.get("rows", []):
                             if position["assortment"]["id"] == product_id:
@@ -138,7 +139,7 @@ class MoySkladDataCollector:
                     logger.error(f"Ошибка получения остатков: {response.status_code}")
                     return []
                 
-                data = response.json()
+                data = json_loads(response.content)
                 stock_data = []
                 
                 for row in data.get("rows", []):
@@ -173,37 +174,40 @@ class MLModelTrainer:
         df['date'] = pd.to_datetime(df['date'])
         df = df.set_index('date').sort_index()
         
-        # Группируем по дням
-        daily_sales = df.groupby(df.index.date).agg({
+        # Группируем по дням: ключ - полночь дня (datetime64), без Python-объектов date;
+        # как и раньше, в выборку попадают только дни с продажами
+        daily_sales = df.groupby(df.index.normalize()).agg({
             'quantity': 'sum',
             'price': 'mean',
             'sum': 'sum'
-        }).reset_index()
-        daily_sales['date'] = pd.to_datetime(daily_sales['date'])
-        daily_sales = daily_sales.set_index('date')
+        })
+        daily_sales.index.name = 'date'
         
-        # Добавляем временные признаки
-        daily_sales['year'] = daily_sales.index.year
-        daily_sales['month'] = daily_sales.index.month
-        daily_sales['day'] = daily_sales.index.day
-        daily_sales['day_of_year'] = daily_sales.index.dayofyear
-        daily_sales['day_of_week'] = daily_sales.index.dayofweek
-        daily_sales['is_month_start'] = daily_sales.index.day == 1
-        daily_sales['is_quarter_start'] = (daily_sales.index.day == 1) & (daily_sales.index.month.isin([1, 4, 7, 10]))
-        daily_sales['is_weekend'] = daily_sales.index.dayofweek >= 5
+        # Добавляем временные признаки: компоненты даты извлекаются из индекса один раз
+        idx = daily_sales.index
+        month = idx.month.to_numpy()
+        day = idx.day.to_numpy()
+        day_of_week = idx.dayofweek.to_numpy()
+        daily_sales['year'] = idx.year.to_numpy()
+        daily_sales['month'] = month
+        daily_sales['day'] = day
+        daily_sales['day_of_year'] = idx.dayofyear.to_numpy()
+        daily_sales['day_of_week'] = day_of_week
+        daily_sales['is_month_start'] = day == 1
+        daily_sales['is_quarter_start'] = (day == 1) & np.isin(month, [1, 4, 7, 10])
+        daily_sales['is_weekend'] = day_of_week >= 5
         
         # Сезонные признаки
-        daily_sales['is_holiday_season'] = daily_sales.index.month.isin([12, 1, 2])
-        daily_sales['is_summer_season'] = daily_sales.index.month.isin([6, 7, 8])
-        
-        # Лаговые признаки
-        daily_sales['quantity_lag_1'] = daily_sales['quantity'].shift(1)
-        daily_sales['quantity_lag_7'] = daily_sales['quantity'].shift(7)
-        daily_sales['quantity_lag_30'] = daily_sales['quantity'].shift(30)
+        daily_sales['is_holiday_season'] = np.isin(month, [12, 1, 2])
+        daily_sales['is_summer_season'] = np.isin(month, [6, 7, 8])
         
-        # Скользящие средние
-        daily_sales['quantity_ma_7'] = daily_sales['quantity'].rolling(7).mean()
-        daily_sales['quantity_ma_30'] = daily_sales['quantity'].rolling(30).mean()
+        # Лаговые признаки и скользящие средние - одним проходом по ряду продаж
+        lags = lags_and_mas(daily_sales['quantity'].to_numpy(dtype=np.float64))
+        daily_sales['quantity_lag_1'] = lags[:, 0]
+        daily_sales['quantity_lag_7'] = lags[:, 1]
+        daily_sales['quantity_lag_30'] = lags[:, 2]
+        daily_sales['quantity_ma_7'] = lags[:, 3]
+        daily_sales['quantity_ma_30'] = lags[:, 4]
         
         # Удаляем NaN значения
         daily_sales = daily_sales.dropna()
@@ -245,13 +249,16 @@ class MLModelTrainer:
             'feature_columns': feature_columns
         }
         
-        # Случайный лес
+        # Масштабированные копии нужны только линейной модели
+        del X_train_scaled, X_test_scaled
+        
+        # Случайный лес: деревья инвариантны к масштабу, обучаем на исходной матрице
         rf_model = RandomForestRegressor(n_estimators=100, random_state=42)
-        rf_model.fit(X_train_scaled, y_train)
-        rf_score = rf_model.score(X_test_scaled, y_test)
+        rf_model.fit(X_train, y_train)
+        rf_score = rf_model.score(X_test, y_test)
         models['random_forest'] = {
             'model': rf_model,
-            'scaler': scaler,
+            'scaler': None,
             'accuracy': rf_score,
             'feature_columns': feature_columns
         }
@@ -273,18 +280,11 @@ class MLModelTrainer:
             'model_type': 'real_data'
         }
         
+        # Модели и скейлеры товара сохраняются одним сжатым joblib-файлом
+        bundle_path = save_model_bundle(self.models_dir, product_id, models)
+        
         for model_name, model_info in models.items():
-            # Сохраняем модель
-            model_path = os.path.join(self.models_dir, f"{product_id}_{model_name}.pkl")
-            with open(model_path, 'wb') as f:
-                pickle.dump(model_info['model'], f)
-            
-            # Сохраняем scaler
-            scaler_path = os.path.join(self.models_dir, f"{product_id}_{model_name}_scaler.pkl")
-            with open(scaler_path, 'wb') as f:
-                pickle.dump(model_info['scaler'], f)
-            
-            model_data['models'][model_name] = model_path
+            model_data['models'][model_name] = bundle_path
             model_data['results'][model_name] = {
                 'accuracy': model_info['accuracy'],
                 'feature_columns': model_info['feature_columns']
@@ -292,8 +292,8 @@ class MLModelTrainer:
         
         # Сохраняем метаданные
         metadata_path = os.path.join(self.models_dir, f"{product_id}_metadata.json")
-        with open(metadata_path, 'w') as f:
-            json.dump(model_data, f, indent=2)
+        with open(metadata_path, 'wb') as f:
+            f.write(json_dumps(model_data, indent=True))
         
         logger.info(f"Модели для товара {product_id} сохранены в {self.models_dir}")
 
@@ -359,4 +359,10 @@ async def main():
     logger.info("🎉 Обучение моделей завершено!")
 
 if __name__ == "__main__":
+    # Цикл событий на libuv, если установлен uvloop
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
     asyncio.run(main()) 
\ No newline at end of file